@@ -4,7 +4,11 @@ from .scrisper import (
     Populate, 
     MaskedCrossover, 
     MaskedMutation, 
+    TelephoneMutation,
+    AdaptiveOperators,
+    SmartTournament,
     SortByFitness, 
+    ParetoSort,
     CapPopulation
 )
 from .agents import (
@@ -18,6 +22,18 @@ from .agents import (
     MaskedCrossoverAgent
 )
 from .genetics import Individual
+from .population import Population
+from .masking import MaskingEngine, MaskStats
+from .parsing import ParseError, extract_tags, strip_code_fences, validate_python
+from .validation import GenotypeSpec, validate_genotype
+from .wheelhouse import Wheelhouse
+from .dependencies import canonicalize_requirements, requirements_key
+from .budget import TokenBudget, BudgetExceeded
+from .messages import MessageLayout
+from .novelty import NoveltyArchive
+from .lineage import LineageStore
+from .runlog import RunLog, RunLogReader
+from .pareto import DEFAULT_OBJECTIVES, fast_non_dominated_sort, crowding_distance, nsga2_sort
 from .llm_base import LLMBase
 from .selection import (
     random_selection,
@@ -25,6 +41,8 @@ from .selection import (
     roulette_wheel_selection,
     rank_selection,
     elitism_selection,
+    novelty_selection,
+    nsga2_selection,
 )
 from .general_scrisper import general_scrisper
 
@@ -33,7 +51,30 @@ __all__ = [
     'Environment',
     'Layer',
     'Individual',
+    'Population',
     'LLMBase',
+    'MaskingEngine',
+    'MaskStats',
+    'ParseError',
+    'extract_tags',
+    'strip_code_fences',
+    'validate_python',
+    'GenotypeSpec',
+    'validate_genotype',
+    'Wheelhouse',
+    'canonicalize_requirements',
+    'requirements_key',
+    'TokenBudget',
+    'BudgetExceeded',
+    'MessageLayout',
+    'NoveltyArchive',
+    'LineageStore',
+    'RunLog',
+    'RunLogReader',
+    'DEFAULT_OBJECTIVES',
+    'fast_non_dominated_sort',
+    'crowding_distance',
+    'nsga2_sort',
     
     # Agents
     'Agent',
@@ -49,7 +90,11 @@ __all__ = [
     'Populate',
     'MaskedCrossover',
     'MaskedMutation',
+    'TelephoneMutation',
+    'AdaptiveOperators',
+    'SmartTournament',
     'SortByFitness',
+    'ParetoSort',
     'CapPopulation',
     
     # Selection functions
@@ -57,6 +102,8 @@ __all__ = [
     'tournament_selection',
     'roulette_wheel_selection',
     'rank_selection',
+    'novelty_selection',
+    'nsga2_selection',
 
     # General scrisper
     'general_scrisper',
@@ -1,33 +1,31 @@
 import os
 import random
 import json
+import copy
+from typing import Callable
 from llm_base import LLMBase
+from masking import MaskingEngine
+from messages import MessageLayout
+from parsing import ParseError, extract_all, extract_tags, parse_response, strip_code_fences
 
 
-PROJECT_PROMPT = open("prompts/project_agent.md").read()
-TOURN_PROMPT = open("prompts/tournament.md").read()
-TELE_PROMPT = open("prompts/telephone_agent.md").read()
-UNMASK_CROSSOVER_PROMPT = open("prompts/unmask_crossover.md").read()
-UNMASK_MUTATION_PROMPT = open("prompts/unmask_mutation.md").read()
-PHENOTYPE_PROMPT = open("prompts/phenotype_agent.md").read()
-GENOTYPE_PROMPT = open("prompts/genotype_agent.md").read()
+# Prompts ship next to the code, so agents work from any working directory
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+def load_prompt(name):
+    with open(os.path.join(PROMPTS_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+PROJECT_PROMPT = load_prompt("project_agent.md")
+TOURN_PROMPT = load_prompt("tournament.md")
+TELE_PROMPT = load_prompt("telephone_agent.md")
+UNMASK_CROSSOVER_PROMPT = load_prompt("unmask_crossover.md")
+UNMASK_MUTATION_PROMPT = load_prompt("unmask_mutation.md")
+PHENOTYPE_PROMPT = load_prompt("phenotype_agent.md")
+GENOTYPE_PROMPT = load_prompt("genotype_agent.md")
 def parse_xml_tag(tag, text):
-    start = text.find(f"<{tag}>")
-    if start == -1:
-        raise ValueError(f"Opening tag <{tag}> not found in text")
-    
-    start_content = start + len(f"<{tag}>")
-    end = text.find(f"</{tag}>", start_content)
-    if end == -1:
-        # If closing tag not found, return everything after the opening tag
-        content = text[start_content:]
-        print(f"No closing tag found for <{tag}>. Using content: {content}")
-        return content
-    
-    content = text[start_content:end]
-    
-    return content
+    return extract_tags(text, [tag])[tag]
 def clean_code(code):
+    # Drops the fence markers but keeps all content, use strip_code_fences to keep only the fenced code
     return code.replace("```python", "").replace("```", "")
 
 class Agent:
@@ -41,9 +39,49 @@ class Agent:
         """
         self.llm = llm
         self.system_prompt = system_prompt
-        self.messages = [{'role': 'system', 'content': self.system_prompt}]
+        self.layout = MessageLayout(system_prompt)
+        self.history = []
+
+    @property
+    def messages(self) -> list[dict]:
+        return self.layout.build(self.history)
+
+    def set_context(self, name: str, content: str):
+        """
+        Add stable content (schematic, examples, ...) to the cacheable prefix.
+        Changing a block drops the conversation, since it was built on the old prefix.
+        """
+        if self.layout.set_block(name, content):
+            self.history = []
+
+    def fork(self) -> "Agent":
+        """
+        A copy of the agent with the same settings and prefix but an empty conversation,
+        for making concurrent requests without sharing history between threads.
+        """
+        clone = copy.copy(self)
+        clone.layout = copy.copy(self.layout)
+        clone.layout.blocks = dict(self.layout.blocks)
+        clone.history = []
+        return clone
+
+    def reset(self):
+        """Drop the conversation, so the next request is just the cacheable prefix plus the prompt."""
+        self.history = []
+
+    def _complete(self, prompt: str, model: str, temperature: float, max_tokens: int = None) -> str:
+        self.history.append({'role': 'user', 'content': prompt})
+        response = self.llm.chat_completion(
+            messages=self.messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            source=type(self).__name__
+        )
+        self.history.append({'role': 'assistant', 'content': response})
+        return response
 
-    def answer(self, prompt: str, model: str, temperature: float = .7, max_tokens: int = 32000,  tags: list[str] = None) -> tuple[str, list[str]]:
+    def answer(self, prompt: str, model: str, temperature: float = .7, max_tokens: int = None,  tags: list[str] = None, code_tags: list[str] = None, retries: int = 1) -> tuple[str, list[str]]:
         """
         Send a prompt to the LLM and get a response.
         
@@ -51,25 +89,47 @@ class Agent:
             prompt: The user prompt to send to the LLM
             model: Optional override for the default model
             temperature: Optional override for the default temperature
-            max_tokens: Optional override for the default max_tokens
+            max_tokens: Optional cap on completion tokens, also capped by the LLM's token budget
+            tags: Tags to extract from the response
+            code_tags: Subset of tags that must contain Python code, these are stripped of fences and compiled
+            retries: How many targeted re-asks to make for tags that are missing or do not compile
             
         Returns:
-            The text response from the model
+            The text response from the model and the contents of the requested tags
         """
-        self.messages.append({'role': 'user', 'content': prompt})
-        response = self.llm.chat_completion(
-            messages=self.messages,
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-        self.messages.append({'role': 'assistant', 'content': response})
-        parsed_tags = []
-        if tags:            
-            for tag in tags:
-                parsed_tags.append(parse_xml_tag(tag, response))
-        return response, parsed_tags
+        response = self._complete(prompt, model, temperature, max_tokens)
+        if not tags:
+            return response, []
+
+        parsed = {}
+        pending = list(tags)
+        for attempt in range(retries + 1):
+            try:
+                parsed.update(parse_response(response, pending, [tag for tag in code_tags or [] if tag in pending]))
+                break
+            except ParseError as e:
+                parsed.update(e.parsed)
+                pending = e.failed_tags
+                if attempt == retries:
+                    raise
+                print(f"Malformed response ({e}), re-asking for {pending}")
+                response = self.reask(e, model)
+        return response, [parsed[tag] for tag in tags]
+
+    def reask(self, error: ParseError, model: str) -> str:
+        """
+        Ask the model to resend only the tags that failed to parse.
 
+        Args:
+            error: The ParseError describing the failed tags
+            model: The model to use
+
+        Returns:
+            The text response from the model
+        """
+        layout = "\n".join(f"<{tag}>\n...\n</{tag}>" for tag in error.failed_tags)
+        message = f"Your previous response could not be used: {error}.\nReply with only the corrected sections, in this format:\n{layout}"
+        return self._complete(message, model, temperature=0)
 
 
 class ProjectAgent(Agent):
@@ -79,7 +139,7 @@ class ProjectAgent(Agent):
 
 
     def generate_project_codes(self, prompt):
-       raw_response, [schematic, fitness] = super().answer(prompt, self.model,temperature=.7, tags=["schematic", "fitness"])
+       raw_response, [schematic, fitness] = super().answer(prompt, self.model,temperature=.7, tags=["schematic", "fitness"], code_tags=["fitness"])
        return raw_response, schematic, fitness
 
     
@@ -90,13 +150,32 @@ class TournamentAgent(Agent):
         self.model = model
 
     def mutate(self, evolved_prompts, problem_prompt, temperature: float = 0):
+        self.reset()
         message = f"Here are some prompts to solve the problem, '{problem_prompt}':\n"
         for i, prompt in enumerate(evolved_prompts):
             message += f"<example name=\"example_{i}\">\n{prompt}\n</example>\n"
         message += f"\nHere is the problem prompt:\n{problem_prompt}"
-        response, [selection] = super().answer(message, self.model, temperature=temperature, tags=["<selection>"])
+        response, [selection] = super().answer(message, self.model, temperature=temperature, tags=["selection"])
         return response, selection
 
+    def judge(self, prompt_a, prompt_b, problem_prompt, temperature: float = 0):
+        """
+        Pairwise match between two prompts. The problem goes into the cacheable prefix,
+        so a batch of matches for the same problem shares it.
+
+        Returns:
+            A tuple containing (raw_response, 0 if prompt_a won else 1)
+        """
+        self.set_context("Problem", problem_prompt)
+        message = ("Which of these two prompts is more promising for the problem?\n"
+                   f"<example name=\"example_0\">\n{prompt_a}\n</example>\n"
+                   f"<example name=\"example_1\">\n{prompt_b}\n</example>\n")
+        response, [selection] = super().answer(message, self.model, temperature=temperature, tags=["selection"])
+        winner = selection.strip().strip('"')
+        if winner not in ("example_0", "example_1"):
+            raise ParseError(f"Expected example_0 or example_1 in <selection>, got {winner!r}", invalid={"selection": winner})
+        return response, int(winner[-1])
+
 class TelephoneMutationAgent(Agent):
     def __init__(self, llm: LLMBase, model: str = "gemma3-27b"):
         super().__init__(llm, TELE_PROMPT)
@@ -113,16 +192,35 @@ class TelephoneMutationAgent(Agent):
         Returns:
             A tuple containing (raw_response, generated_prompt)
         """
+        # Each call is independent, earlier exchanges would only be re-sent at full cost
+        self.reset()
         message = f"Here is some code to write a prompt for:\n```\n{code}\n```"
         response, [prompt] = self.answer(message, self.model, temperature=temperature, tags=["prompt"])
         return response, prompt
     
 class UnmaskMutationAgent(Agent):
-    def __init__(self, llm: LLMBase, model: str = "gemma3-27b"):
+    def __init__(self, llm: LLMBase, model: str = "gemma3-27b", seed: int = None):
         super().__init__(llm, UNMASK_MUTATION_PROMPT)
         self.model = model
+        self.masking = MaskingEngine(seed=seed)
+
+    def configure_masking(self, mask_rate: float = 0.5, mask_size: range = range(1, 10), split_by_spaces: bool = False, granularity: str = None):
+        """
+        Configure the agent's MaskingEngine. The engine is seeded once, so repeated calls stay reproducible.
+
+        Args:
+            mask_rate: The probability of masking a section of text
+            mask_size: The range of token sizes to mask
+            split_by_spaces: If True, masks whole words, otherwise masks by characters
+            granularity: Overrides split_by_spaces with "char", "token", "word" or "line"
+
+        Returns:
+            The configured MaskingEngine
+        """
+        granularity = granularity or ("word" if split_by_spaces else "char")
+        return self.masking.configure(mask_rate, mask_size, granularity)
 
-    def unmask_mutation(self, prompt, temperature: float = 0, mask_rate: float = 0.5, mask_size: range = range(1, 10), split_by_spaces: bool = False):
+    def unmask_mutation(self, prompt, temperature: float = 0, mask_rate: float = 0.5, mask_size: range = range(1, 10), split_by_spaces: bool = False, granularity: str = None):
         """
         Fills in masked sections of a prompt with enhanced content.
         
@@ -132,50 +230,37 @@ class UnmaskMutationAgent(Agent):
             mask_rate: The probability of masking a section of text
             mask_size: The range of token sizes to mask
             split_by_spaces: If True, splits text by spaces before masking, otherwise masks by characters
+            granularity: Overrides split_by_spaces with "char", "token", "word" or "line"
             
         Returns:
             A tuple containing (raw_response, unmasked_prompt)
         """
-        # Apply masking to the prompt
-        if split_by_spaces:
-            tokens = prompt.split()
-            masked_tokens = []
-            i = 0
-            while i < len(tokens):
-                if random.random() < mask_rate:
-                    # Determine mask size (but don't exceed remaining tokens)
-                    size = min(random.choice(mask_size), len(tokens) - i)
-                    masked_tokens.append("[MASK]")
-                    i += size
-                else:
-                    masked_tokens.append(tokens[i])
-                    i += 1
-            masked_prompt = " ".join(masked_tokens)
-        else:
-            chars = list(prompt)
-            masked_chars = []
-            i = 0
-            while i < len(chars):
-                if random.random() < mask_rate:
-                    # Determine mask size (but don't exceed remaining chars)
-                    size = min(random.choice(mask_size), len(chars) - i)
-                    masked_chars.append("[MASK]")
-                    i += size
-                else:
-                    masked_chars.append(chars[i])
-                    i += 1
-            masked_prompt = "".join(masked_chars)
-        
+        masked_prompt = self.configure_masking(mask_rate, mask_size, split_by_spaces, granularity).mask(prompt)
+        return self.unmask(masked_prompt, temperature)
+
+    def unmask(self, masked_prompt, temperature: float = 0):
+        """
+        Fills in an already masked prompt, e.g. one produced by MaskingEngine.mask_batch.
+
+        Args:
+            masked_prompt: The prompt containing [MASK] sections
+            temperature: The temperature to use for generation
+
+        Returns:
+            A tuple containing (raw_response, unmasked_prompt)
+        """
+        self.reset()
         message = f"Here is a prompt with masked sections:\n{masked_prompt}"
         response, [unmasked_prompt] = self.answer(message, self.model, temperature=temperature, tags=["unmasked_prompt"])
         return response, unmasked_prompt
         
 class MaskedCrossoverAgent(Agent):
-    def __init__(self, llm: LLMBase, model: str = "gemma3-27b"):
-        super().__init__(llm, open("prompts/unmask_crossover.md", "r", encoding="utf-8").read())
+    def __init__(self, llm: LLMBase, model: str = "gemma3-27b", seed: int = None):
+        super().__init__(llm, UNMASK_CROSSOVER_PROMPT)
         self.model = model
+        self.masking = MaskingEngine(seed=seed)
         
-    def crossover(self, parent1, parent2, temperature: float = 0, mask_rate: float = 0.3, mask_size: range = range(1, 10)):
+    def crossover(self, parent1, parent2, temperature: float = 0, mask_rate: float = 0.3, mask_size: range = range(1, 10), granularity: str = "word"):
         """
         Creates a child prompt by intelligently combining elements from two parent prompts.
         
@@ -186,14 +271,14 @@ class MaskedCrossoverAgent(Agent):
             temperature: The temperature to use for generation
             mask_rate: The probability of masking a section of text
             mask_size: The range of token sizes to mask
+            granularity: The masking granularity, "char", "token", "word" or "line"
             
         Returns:
             A tuple containing (raw_response, child_prompt)
         """
-        # Apply masking to both parents
-        unmask_agent = UnmaskMutationAgent(self.llm, self.model)
-        masked_parent1 = unmask_agent.unmask_mutation(parent1.get_prompt(), 0, mask_rate, mask_size, True)[1]
-        masked_parent2 = unmask_agent.unmask_mutation(parent2.get_prompt(), 0, mask_rate, mask_size, True)[1]
+        self.reset()
+        # Mask both parents in a single batch
+        masked_parent1, masked_parent2 = self.masking.configure(mask_rate, mask_size, granularity).mask_batch([parent1.get_prompt(), parent2.get_prompt()])
         
         message = f"""1. Parent prompt 1 with masked sections:
             {masked_parent1}
@@ -219,13 +304,65 @@ class PhenotypeAgent(Agent):
         message = f"Please come up with a unique prompt for software that will solve the following problem: {problem_prompt}"
         response, [phenotype] = super().answer(message, self.model, temperature=temperature, tags=["prompt"])
         return response, phenotype
+
+    def generate_phenotypes(self, problem_prompt, n: int, temperature: float = .9):
+        """
+        Ask for n distinct phenotypes in a single call.
+
+        Returns:
+            A tuple containing (raw_response, phenotypes), phenotypes may hold fewer than n entries
+        """
+        message = (f"Please come up with {n} unique prompts for software that will solve the following problem: {problem_prompt}\n\n"
+                   f"Each prompt must take a substantially different approach. Put each prompt in its own <prompt></prompt> tag.")
+        response, _ = super().answer(message, self.model, temperature=temperature)
+        phenotypes = [p.strip() for p in extract_all(response, "prompt") if p.strip()]
+        if not phenotypes:
+            raise ParseError("No <prompt> tags found in response", missing=["prompt"])
+        return response, phenotypes
     
 class GenotypeAgent(Agent):
     def __init__(self, llm: LLMBase, model: str = "gemma3-27b"):
         super().__init__(llm, GENOTYPE_PROMPT)
         self.model = model
 
-    def generate_genotype(self, phenotype, temperature: float = 0):
+    def set_schematic(self, schematic: str):
+        self.set_context("Schematic", schematic)
+
+    def generate_genotype(self, phenotype, temperature: float = 0, validator: Callable[..., list[str]] = None, reprompts: int = 1, schematic: str = None):
+        """
+        Generate genotype.py and requirements.txt for a phenotype.
+
+        Every genotype is generated independently: the conversation is reset so the
+        request is the system prompt and schematic (a cacheable prefix) plus the phenotype.
+
+        Args:
+            phenotype: The implementation prompt
+            temperature: The temperature to use for generation
+            validator: Optional callable returning a list of problems for (genotype, requirements, warnings=[]),
+                appending non-fatal findings to warnings, e.g. Environment.validate_genotype
+            reprompts: How many times to ask for a fix when the validator reports problems or warnings
+            schematic: The project schematic, kept in the cacheable prefix
+
+        Returns:
+            A tuple containing (raw_response, genotype, requirements)
+        """
+        if schematic is not None:
+            self.set_schematic(schematic)
+        self.reset()
         message = f"{phenotype}"
-        response, [genotype, requirements] = super().answer(message, self.model, temperature=temperature, tags=["genotype_py", "requirements_txt"])
-        return response, genotype, requirements if requirements else "pytest\n"
\ No newline at end of file
+        for attempt in range(reprompts + 1):
+            response, [genotype, requirements] = super().answer(message, self.model, temperature=temperature, tags=["genotype_py", "requirements_txt"], code_tags=["genotype_py"])
+            requirements = strip_code_fences(requirements)
+            warnings = []
+            problems = validator(genotype, requirements, warnings=warnings) if validator else []
+            if not (problems or warnings) or attempt == reprompts:
+                break
+            print(f"Genotype failed validation, re-prompting: {problems + warnings}")
+            message = ""
+            if problems:
+                message += "Your implementation was rejected before running:\n" + "\n".join(f"- {p}" for p in problems) + "\n"
+            if warnings:
+                # Only likely problems, the import name may legitimately differ from the distribution name
+                message += "These will probably fail at runtime:\n" + "\n".join(f"- {w}" for w in warnings) + "\nAdd any missing distributions to requirements.txt.\n"
+            message += "Fix these problems and reply with the full <genotype_py> and <requirements_txt> again."
+        return response, genotype, requirements if requirements else "pytest\n"
@@ -0,0 +1,169 @@
+import threading
+from typing import Optional
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised before an LLM call once the hard token budget has been spent."""
+
+
+def _empty_usage() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "calls": 0}
+
+
+class TokenBudget:
+    def __init__(
+        self,
+        hard_limit: Optional[int] = None,
+        soft_limit: Optional[int] = None,
+        target_per_generation: Optional[int] = None,
+        min_scale: float = 0.25,
+        max_scale: float = 1.0,
+        max_tokens_per_call: Optional[int] = None,
+    ):
+        """
+        Track token spend per agent, layer and generation and keep it within budget.
+
+        Args:
+            hard_limit: Total tokens after which further LLM calls raise BudgetExceeded
+            soft_limit: Total tokens after which layer fan-out is cut to min_scale
+            target_per_generation: Tokens per generation to aim for, fan-out is scaled towards it
+            min_scale: Lower bound for the fan-out scale factor
+            max_scale: Upper bound for the fan-out scale factor
+            max_tokens_per_call: max_tokens sent with calls that don't set one, None leaves it unset
+        """
+        self.hard_limit = hard_limit
+        self.soft_limit = soft_limit
+        self.target_per_generation = target_per_generation
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.max_tokens_per_call = max_tokens_per_call
+        self.generation = 0
+        self.layer = None
+        self.by_agent: dict[str, dict] = {}
+        self.by_layer: dict[str, dict] = {}
+        self.by_generation: dict[int, dict] = {}
+        self.best_fitness: dict[int, float] = {}
+        self.scale_used: dict[int, float] = {}
+        self.lock = threading.Lock()
+
+    def set_context(self, generation: Optional[int] = None, layer: Optional[str] = None):
+        """Set the generation and layer that subsequent calls are charged to."""
+        if generation is not None:
+            self.generation = generation
+        if self.generation not in self.scale_used:
+            self.scale_used[self.generation] = self.scale_factor()
+        self.layer = layer
+
+    def record(self, agent: str, usage: Optional[dict]):
+        """
+        Charge the usage of one LLM call.
+
+        Args:
+            agent: Name of the agent that made the call
+            usage: Dict with prompt_tokens, completion_tokens and optionally cached_tokens
+        """
+        if not usage:
+            return
+        with self.lock:
+            buckets = [
+                self.by_agent.setdefault(agent or "unknown", _empty_usage()),
+                self.by_layer.setdefault(self.layer or "none", _empty_usage()),
+                self.by_generation.setdefault(self.generation, _empty_usage()),
+            ]
+            for bucket in buckets:
+                bucket["prompt_tokens"] += usage.get("prompt_tokens", 0) or 0
+                bucket["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+                bucket["cached_tokens"] += usage.get("cached_tokens", 0) or 0
+                bucket["calls"] += 1
+
+    @property
+    def spent(self) -> int:
+        return sum(u["prompt_tokens"] + u["completion_tokens"] for u in self.by_generation.values())
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.hard_limit is None:
+            return None
+        return max(0, self.hard_limit - self.spent)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.hard_limit is not None and self.spent >= self.hard_limit
+
+    @property
+    def over_soft_limit(self) -> bool:
+        return self.soft_limit is not None and self.spent >= self.soft_limit
+
+    def check(self):
+        if self.exhausted:
+            raise BudgetExceeded(f"Token budget of {self.hard_limit} exhausted ({self.spent} spent)")
+
+    def max_tokens(self, requested: Optional[int]) -> Optional[int]:
+        """
+        Cap a completion's max_tokens to what is left of the hard budget. Calls without a
+        max_tokens (and no max_tokens_per_call) are left uncapped, because backends reject
+        values above the model's output limit; check() enforces the hard limit instead.
+        """
+        if requested is None:
+            requested = self.max_tokens_per_call
+        remaining = self.remaining
+        if requested is None or remaining is None:
+            return requested
+        return max(1, min(requested, remaining))
+
+    def scale_factor(self) -> float:
+        """
+        Factor to apply to layer fan-out. The spend of completed generations, normalized
+        by the factor each one ran at, is compared to the target spend rate; past the
+        soft limit the minimum scale is used.
+        """
+        if self.over_soft_limit:
+            return self.min_scale
+        completed = [
+            (u["prompt_tokens"] + u["completion_tokens"]) / self.scale_used.get(g, self.max_scale)
+            for g, u in self.by_generation.items() if g < self.generation
+        ]
+        if not self.target_per_generation or not completed:
+            return self.max_scale
+        unscaled_average = sum(completed) / len(completed)
+        if unscaled_average == 0:
+            return self.max_scale
+        return min(self.max_scale, max(self.min_scale, self.target_per_generation / unscaled_average))
+
+    def scaled(self, count: int) -> int:
+        """Scale a fan-out count such as num_families or num_children, never below 1."""
+        return max(1, round(count * self.scale_factor()))
+
+    def record_fitness(self, generation: int, best_fitness: float):
+        self.best_fitness[generation] = best_fitness
+
+    def cost_per_improvement(self) -> Optional[float]:
+        """Tokens spent per unit of improvement in best fitness, None if fitness never improved."""
+        if len(self.best_fitness) < 2:
+            return None
+        generations = sorted(self.best_fitness)
+        improvement = self.best_fitness[generations[-1]] - self.best_fitness[generations[0]]
+        if improvement <= 0:
+            return None
+        return self.spent / improvement
+
+    def cache_hit_rates(self) -> dict[str, float]:
+        """Prefix-cache hit rate per agent, for backends that report cached prompt tokens."""
+        return {
+            agent: usage["cached_tokens"] / usage["prompt_tokens"]
+            for agent, usage in self.by_agent.items() if usage["prompt_tokens"]
+        }
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                "spent": self.spent,
+                "hard_limit": self.hard_limit,
+                "soft_limit": self.soft_limit,
+                "scale_factor": self.scale_factor(),
+                "by_agent": {k: dict(v) for k, v in self.by_agent.items()},
+                "by_layer": {k: dict(v) for k, v in self.by_layer.items()},
+                "by_generation": {k: dict(v) for k, v in self.by_generation.items()},
+                "cost_per_improvement": self.cost_per_improvement(),
+                "cache_hit_rates": self.cache_hit_rates(),
+            }
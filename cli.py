@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import threading
+import contextlib
+import selection
+from scrisper import Environment, Populate, MaskedCrossover, MaskedMutation, TelephoneMutation, AdaptiveOperators, SmartTournament, SortByFitness, ParetoSort, CapPopulation
+from agents import ProjectAgent, PhenotypeAgent, GenotypeAgent, MaskedCrossoverAgent, UnmaskMutationAgent, TelephoneMutationAgent, TournamentAgent
+from llm_base import LLMBase
+from wheelhouse import Wheelhouse
+from budget import TokenBudget
+from novelty import NoveltyArchive
+from lineage import LineageStore
+from runlog import RunLog
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Mirrors general_scrisper at scale 1. Crossover selects with replacement so it always gets
+# two parents, mutation works in place and needs distinct individuals
+DEFAULT_CONFIG = {
+    "generations": 1,
+    "layers": [
+        {"type": "Populate", "population_size": 2},
+        {"type": "MaskedCrossover", "selection": {"function": "random_selection", "k": 2, "replace": True}, "num_families": 2, "num_children": 2},
+        {"type": "MaskedMutation", "selection": {"function": "random_selection", "k": 3}},
+        {"type": "CapPopulation", "max_size": 15},
+    ],
+}
+
+
+class ProgressStream:
+    def __init__(self, stream):
+        """Thread-safe JSON-lines writer for Environment progress events, one flushed line per event."""
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def load_config(path: str = None) -> dict:
+    """Read a layer config from JSON or, if PyYAML is installed, YAML."""
+    if path is None:
+        return DEFAULT_CONFIG
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise SystemExit("YAML configs need PyYAML, install it or use a JSON config")
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def build_selection(spec, archive: NoveltyArchive = None):
+    """
+    Turn {"function": "tournament_selection", "k": 2, ...} into a selection function.
+    novelty_selection gets the environment's novelty archive.
+    """
+    if spec is None:
+        return lambda individuals: individuals
+    if isinstance(spec, str):
+        spec = {"function": spec}
+    params = {key: value for key, value in spec.items() if key != "function"}
+    function = getattr(selection, spec["function"])
+    if "archive" in inspect.signature(function).parameters:
+        params["archive"] = archive
+    return lambda individuals: function(individuals, **params)
+
+
+def build_layer(spec: dict, agents: dict, archive: NoveltyArchive = None, workers: int = 1):
+    params = {key: value for key, value in spec.items() if key not in ("type", "selection")}
+    kind = spec["type"]
+    if kind == "Populate":
+        params.setdefault("max_workers", workers)
+        return Populate(agents["phenotype"], agents["genotype"], **params)
+    if kind == "MaskedCrossover":
+        return MaskedCrossover(agents["crossover"], build_selection(spec.get("selection"), archive), genotype_agent=agents["genotype"], **params)
+    if kind == "MaskedMutation":
+        if "mask_size" in params:
+            params["mask_size"] = range(*params["mask_size"])
+        return MaskedMutation(agents["mutation"], build_selection(spec.get("selection"), archive), agents["genotype"], **params)
+    if kind == "TelephoneMutation":
+        return TelephoneMutation(agents["telephone"], build_selection(spec.get("selection"), archive), agents["genotype"], **params)
+    if kind == "AdaptiveOperators":
+        operators = {name: build_layer(operator, agents, archive, workers) for name, operator in params.pop("operators").items()}
+        return AdaptiveOperators(operators, **params)
+    if kind == "SmartTournament":
+        params.setdefault("max_workers", workers)
+        return SmartTournament(agents["tournament"], **params)
+    if kind == "SortByFitness":
+        return SortByFitness()
+    if kind == "ParetoSort":
+        if "objectives" in params:
+            params["objectives"] = tuple(tuple(objective) for objective in params["objectives"])
+        return ParetoSort(**params)
+    if kind == "CapPopulation":
+        return CapPopulation(**params)
+    raise ValueError(f"Unknown layer type: {kind}")
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="scrisper", description="Evolve software from a problem description, headless.")
+    parser.add_argument("problem", help="File with the problem description, - for stdin")
+    parser.add_argument("--config", help="Layer config in JSON or YAML, defaults to the general_scrisper layers")
+    parser.add_argument("--generations", type=int, help="Generations to run, overrides the config")
+    parser.add_argument("--output", default=".", help="Directory for environment/ and history.png")
+    parser.add_argument("--resume", action="store_true", help="Continue the run found in the output directory")
+    parser.add_argument("--model", default="qwen-2.5-coder-32b")
+    parser.add_argument("--base-url", help="OpenAI compatible endpoint, defaults to OPENAI_BASE_URL")
+    parser.add_argument("--api-key", help="Defaults to OPENAI_API_KEY")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent LLM calls and setups in Populate")
+    parser.add_argument("--budget", type=int, help="Hard limit on total tokens")
+    parser.add_argument("--soft-budget", type=int, help="Total tokens after which fan-out is cut back")
+    parser.add_argument("--tokens-per-generation", type=int, help="Token spend per generation to aim for")
+    parser.add_argument("--max-tokens-per-call", type=int, help="max_tokens sent with every completion, capped by what is left of --budget")
+    parser.add_argument("--timeout", type=float, help="Wall-clock seconds after which no further layer is started")
+    parser.add_argument("--fitness-timeout", type=float, help="Seconds a single fitness evaluation may take")
+    parser.add_argument("--offline", action="store_true", help="Only install from wheels already in the wheelhouse")
+    parser.add_argument("--share-venvs", action="store_true", help="One venv per requirements set instead of per individual, faster but individuals are no longer isolated from each other")
+    parser.add_argument("--novelty-threshold", type=float, help="Reject prompts at least this similar to an archived one")
+    parser.add_argument("--progress", default="-", help="Where to write the JSON-lines progress stream, - for stdout")
+    return parser.parse_args(argv)
+
+
+def build_environment(args: argparse.Namespace, config: dict, progress) -> Environment:
+    root = os.path.abspath(args.output)
+    env_dir = os.path.join(root, "environment")
+    os.makedirs(env_dir, exist_ok=True)
+
+    budget = None
+    if args.budget or args.soft_budget or args.tokens_per_generation or args.max_tokens_per_call:
+        budget = TokenBudget(hard_limit=args.budget, soft_limit=args.soft_budget, target_per_generation=args.tokens_per_generation,
+                             max_tokens_per_call=args.max_tokens_per_call)
+    llm = LLMBase(api_key=args.api_key, base_url=args.base_url, budget=budget)
+    archive = NoveltyArchive(threshold=args.novelty_threshold) if args.novelty_threshold is not None else None
+
+    agents = {
+        "phenotype": PhenotypeAgent(llm, args.model),
+        "genotype": GenotypeAgent(llm, args.model),
+        "crossover": MaskedCrossoverAgent(llm, args.model),
+        "mutation": UnmaskMutationAgent(llm, args.model),
+        "telephone": TelephoneMutationAgent(llm, args.model),
+        "tournament": TournamentAgent(llm, args.model),
+    }
+    layers = [build_layer(spec, agents, archive, args.workers) for spec in config["layers"]]
+    return Environment(
+        ProjectAgent(llm, args.model),
+        layers,
+        wheelhouse=Wheelhouse(os.path.join(env_dir, "wheelhouse"), offline=args.offline),
+        budget=budget,
+        novelty_archive=archive,
+        lineage=LineageStore(os.path.join(env_dir, "lineage.db")),
+        run_log=RunLog(os.path.join(env_dir, "run.log")),
+        share_venvs=args.share_venvs,
+        root=root,
+        progress=progress,
+        fitness_timeout=args.fitness_timeout,
+    )
+
+
+def run(args: argparse.Namespace, progress) -> Environment:
+    start = time.time()
+    config = load_config(args.config)
+    generations = args.generations if args.generations is not None else config.get("generations", 1)
+    deadline = start + args.timeout if args.timeout else None
+
+    environment = build_environment(args, config, progress)
+    environment.compile()
+    if args.resume and environment.resume():
+        print(f"Resumed at generation {environment.generation} with {len(environment.individuals)} individuals")
+    else:
+        if args.problem == "-":
+            problem = sys.stdin.read()
+        else:
+            with open(args.problem, "r", encoding="utf-8") as f:
+                problem = f.read()
+        environment.init_project(problem)
+    environment.evolve(generations, deadline=deadline)
+    return environment
+
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    if args.progress == "-":
+        # Keep stdout for the progress stream, everything else is printed to stderr
+        progress = ProgressStream(sys.stdout)
+        with contextlib.redirect_stdout(sys.stderr):
+            run(args, progress)
+        return
+    with open(args.progress, "a", encoding="utf-8") as f:
+        run(args, ProgressStream(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import re
+import sys
+import hashlib
+from typing import Optional, Union
+
+REQUIREMENT_PATTERN = re.compile(
+    r"^\s*(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*"
+    r"(?:\[(?P<extras>[^\]]*)\])?\s*"
+    r"(?P<specifiers>[^;]*?)\s*"
+    r"(?:;\s*(?P<marker>.+?))?\s*$"
+)
+
+# Distributions every venv already has, dropped unless a version is requested
+ALWAYS_SATISFIED = {"pip", "setuptools", "wheel"}
+
+# Entries the harness always needs, see partial_fitness.partial_py
+BASE_REQUIREMENTS = ("pytest",)
+
+
+def normalize_name(name: str) -> str:
+    """PEP 503 normalization, so 'NumPy', 'numpy' and 'num_py' compare as expected."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class Requirement:
+    def __init__(self, name: str, extras: set[str] = None, specifiers: set[str] = None, marker: str = None):
+        self.name = normalize_name(name)
+        self.extras = extras or set()
+        self.specifiers = specifiers or set()
+        self.marker = marker
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["Requirement"]:
+        """Parse one requirements.txt line, returns None for blanks, comments and options."""
+        if "://" in line:
+            return None
+        line = line.split("#", 1)[0]
+        if not line.strip() or line.strip().startswith("-"):
+            return None
+        match = REQUIREMENT_PATTERN.match(line)
+        if not match:
+            return None
+        extras = {e.strip().lower() for e in (match.group("extras") or "").split(",") if e.strip()}
+        specifiers = {re.sub(r"\s+", "", s) for s in match.group("specifiers").split(",") if s.strip()}
+        return cls(match.group("name"), extras, specifiers, match.group("marker"))
+
+    def merge(self, other: "Requirement"):
+        self.extras |= other.extras
+        self.specifiers |= other.specifiers
+        self.marker = self.marker or other.marker
+
+    @property
+    def pinned_version(self) -> Optional[str]:
+        for specifier in self.specifiers:
+            if specifier.startswith("==") and "*" not in specifier:
+                return specifier[2:]
+        return None
+
+    def __str__(self):
+        extras = f"[{','.join(sorted(self.extras))}]" if self.extras else ""
+        specifiers = ",".join(sorted(self.specifiers))
+        marker = f"; {self.marker}" if self.marker else ""
+        return f"{self.name}{extras}{specifiers}{marker}"
+
+
+def parse_requirements(text: str) -> list[Requirement]:
+    requirements = []
+    for line in (text or "").splitlines():
+        requirement = Requirement.parse(line)
+        if requirement:
+            requirements.append(requirement)
+    return requirements
+
+
+def load_lockfile(lockfile: Union[str, dict, None]) -> dict[str, str]:
+    """
+    Load a lockfile of name==version lines (e.g. a Wheelhouse constraints.txt) into a dict.
+
+    Args:
+        lockfile: A path, an already loaded dict, or None
+    """
+    if lockfile is None:
+        return {}
+    if isinstance(lockfile, dict):
+        return {normalize_name(name): version for name, version in lockfile.items()}
+    with open(lockfile, "r", encoding="utf-8") as f:
+        return {r.name: r.pinned_version for r in parse_requirements(f.read()) if r.pinned_version}
+
+
+def canonicalize_requirements(
+    text: str,
+    base: tuple[str, ...] = BASE_REQUIREMENTS,
+    lockfile: Union[str, dict, None] = None,
+    satisfied: dict[str, Optional[str]] = None,
+) -> list[str]:
+    """
+    Turn an LLM-written requirements.txt into a canonical, sorted list of entries.
+
+    Entries are parsed and merged by normalized name, comments and pip options are
+    dropped, as are standard library modules (which LLMs like to list) and entries
+    that are already satisfied. Unpinned entries are pinned from the lockfile if given.
+
+    Args:
+        text: The requirements.txt contents
+        base: Entries that are always included, e.g. pytest for the fitness harness
+        lockfile: Optional lockfile path or dict of name -> version used to pin entries
+        satisfied: Distributions already installed, name -> version (None for any version)
+
+    Returns:
+        The canonical requirement lines
+    """
+    locked = load_lockfile(lockfile)
+    satisfied = {normalize_name(name): version for name, version in (satisfied or {}).items()}
+    stdlib = {normalize_name(name) for name in sys.stdlib_module_names}
+
+    merged: dict[str, Requirement] = {}
+    for requirement in parse_requirements("\n".join(base) + "\n" + (text or "")):
+        if requirement.name in merged:
+            merged[requirement.name].merge(requirement)
+        else:
+            merged[requirement.name] = requirement
+
+    lines = []
+    for name in sorted(merged):
+        requirement = merged[name]
+        if name in stdlib:
+            continue
+        if name in ALWAYS_SATISFIED and not requirement.specifiers:
+            continue
+        if name in satisfied and (not requirement.specifiers or requirement.pinned_version == satisfied[name]):
+            continue
+        if not requirement.specifiers and name in locked:
+            requirement.specifiers = {f"=={locked[name]}"}
+        lines.append(str(requirement))
+    return lines
+
+
+def requirements_key(lines: list[str]) -> str:
+    """A stable key for a canonical dependency set, shared by install and caching layers."""
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def render_requirements(lines: list[str]) -> str:
+    return "".join(f"{line}\n" for line in lines)
@@ -7,25 +7,34 @@ from scrisper import Environment, Populate, MaskedCrossover, MaskedMutation, Sor
 from genetics import Individual
 from agents import ProjectAgent, PhenotypeAgent, GenotypeAgent, MaskedCrossoverAgent, UnmaskMutationAgent
 from llm_base import LLMBase
+from wheelhouse import Wheelhouse
+from budget import TokenBudget
+from lineage import LineageStore
+from runlog import RunLog
 import random
 
 
 
 
-def general_scrisper(project_prompt: str, llm: LLMBase, model: str, scale: float = 1, generations: int = 1):
+def general_scrisper(project_prompt: str, llm: LLMBase, model: str, scale: float = 1, generations: int = 1, offline: bool = False, budget: TokenBudget = None):
     if scale > 1:
         print("Scaling up past 1 drastically increases token use and time. Be careful!")
+        if budget is None:
+            print("Pass a TokenBudget to cap token spend.")
+    if budget is not None:
+        llm.budget = budget
     project_agent = ProjectAgent(llm, model)
     phenotype_agent = PhenotypeAgent(llm, model)
     genotype_agent = GenotypeAgent(llm, model)
     masked_crossover_agent = MaskedCrossoverAgent(llm, model)
     unmask_mutation_agent = UnmaskMutationAgent(llm, model)
+    os.makedirs("environment", exist_ok=True)
     environment = Environment(project_agent, [
         Populate(phenotype_agent, genotype_agent, population_size=2 * scale),
         MaskedCrossover(masked_crossover_agent, selection_function=lambda x: random.choices(x, k=2 * scale), num_families=2 * scale, num_children=2 * scale, genotype_agent=genotype_agent),
         MaskedMutation(unmask_mutation_agent, selection_function=lambda x: random.choices(x, k=3 * scale), genotype_agent=genotype_agent),
         CapPopulation(15 * scale)
-    ])
+    ], wheelhouse=Wheelhouse(os.path.join("environment", "wheelhouse"), offline=offline), budget=budget, lineage=LineageStore(os.path.join("environment", "lineage.db")), run_log=RunLog(os.path.join("environment", "run.log")))
 
     environment.compile()
     environment.init_project(project_prompt)
@@ -2,9 +2,35 @@ import os
 import subprocess
 import sys
 import json
+import threading
+import functools
+from wheelhouse import Wheelhouse
+from venvs import VenvPool
+from dependencies import canonicalize_requirements, requirements_key
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """Write content to path unless it already holds exactly that. Returns True if it wrote."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
+def synchronized(method):
+    """Run the method while holding the individual's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class Individual:
-    def __init__(self, directory: str, idstr: str, fitness: float = 0):
+    def __init__(self, directory: str, idstr: str, fitness: float = 0, wheelhouse: Wheelhouse = None, venv_pool: VenvPool = None, venv_dir: str = None, fitness_path: str = None, timeout: float = None):
         # Always store directory as an absolute path
         if os.path.isabs(directory):
             self.directory = directory
@@ -12,11 +38,30 @@ class Individual:
             self.directory = os.path.abspath(directory)
         self.fitness = fitness
         self.idstr = idstr
+        self.wheelhouse = wheelhouse
+        # Serializes everything that touches the individual's files, so layers on different
+        # threads can't evaluate, rewrite and kill the same individual at once
+        self.lock = threading.RLock()
+        self.venv_pool = venv_pool
+        # The shared fitness harness (fitness.py or its compiled .pyc), run against this individual's
+        # directory, the working directory's environment/fitness.py if not given
+        self.fitness_path = os.path.abspath(fitness_path) if fitness_path else None
+        # Seconds a fitness evaluation may take, None waits forever
+        self.timeout = timeout
+        # The individual's own venv by default, or a shared one from the pool or a parent
+        self.venv_dir = os.path.abspath(venv_dir) if venv_dir else os.path.join(self.directory, "venv")
+        # Objective vector for multi-objective selection, see pareto.py
+        self.objectives = {"score": fitness}
     
     def get_prompt(self):
         # reads self.directory/prompt.md
         with open(os.path.join(self.directory, "prompt.md"), "r", encoding="utf-8") as f:
             return f.read()
+    def get_genotype(self):
+        # reads self.directory/genotype.py
+        with open(os.path.join(self.directory, "genotype.py"), "r", encoding="utf-8") as f:
+            return f.read()
+    @synchronized
     def kill(self):
         # Extract the individual's ID from the path
         individual_id = os.path.basename(self.directory)
@@ -28,54 +73,73 @@ class Individual:
         # Move the directory
         os.rename(self.directory, destination)
         
-        # Update the directory attribute to the new absolute path
+        # Update the directory attribute to the new absolute path, an own venv moves along with it
+        own_venv = self.venv_dir == os.path.join(self.directory, "venv")
         self.directory = destination
+        if own_venv:
+            self.venv_dir = os.path.join(self.directory, "venv")
         return True
+    @property
+    def venv_python(self):
+        # Absolute path to the individual's venv interpreter
+        if sys.platform == "win32":
+            return os.path.join(self.venv_dir, "Scripts", "python.exe")
+        return os.path.join(self.venv_dir, "bin", "python")
+
+    @property
+    def requirement_lines(self) -> list[str]:
+        with open(os.path.join(self.directory, "requirements.txt"), "r", encoding="utf-8") as f:
+            return canonicalize_requirements(f.read(), base=())
+
+    @property
+    def requirements_key(self) -> str:
+        return requirements_key(self.requirement_lines)
+
+    @property
+    def shares_venv(self) -> bool:
+        return self.venv_dir != os.path.join(self.directory, "venv")
+
+    @synchronized
+    def update_data(self, **fields):
+        """Merge fields into data.json, keeping whatever the fitness harness wrote."""
+        path = os.path.join(self.directory, "data.json")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data.update(fields)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    # None of the methods below change the process working directory, subprocesses are
+    # started with cwd=self.directory instead, so individuals can be set up from threads.
+    @synchronized
     def test_fitness(self):
         print("Testing fitness")
-        # Save current directory
-        current_dir = os.getcwd()
-        
         try:
-            # Change to the individual's directory using absolute path
-            os.chdir(self.directory)
-            
-            # Use absolute paths for the Python interpreter
-            if sys.platform == "win32":
-                venv_python = os.path.join(self.directory, "venv", "Scripts", "python.exe")
-            else:
-                venv_python = os.path.join(self.directory, "venv", "bin", "python")
-            
-            # Run fitness.py using absolute path
-            fitness_path = os.path.join(self.directory, "fitness.py")
-            output = subprocess.run([venv_python, fitness_path], 
+            # Run the shared harness by absolute path and tell it which individual to evaluate,
+            # cwd only applies to the child process, so evaluations can run from threads
+            fitness_path = self.fitness_path or os.path.join(os.getcwd(), "environment", "fitness.py")
+            output = subprocess.run([self.venv_python, fitness_path, self.directory], 
+                          cwd=self.directory,
                           capture_output=True, 
                           text=True,
+                          timeout=self.timeout,
                           check=False)
             print("output.stdout", output.stdout)
+            if output.returncode != 0:
+                # data.json still holds the old score, don't mistake it for a result
+                raise RuntimeError(f"fitness exited with code {output.returncode}: {output.stderr[-2000:]}")
             self.load_fitness()
             
             return True
         except Exception as e:
+            # The caller decides what happens to a failed individual, see Environment.kill
             self.fitness = 0
+            self.objectives["score"] = 0
             print(f"Individual {self.idstr} failed to test fitness: {e}")
-            self.kill()
-        finally:
-            os.chdir(current_dir)
+            return False
     def install_requirements(self):
-        # Save current directory
-        current_dir = os.getcwd()
-        
         try:
-            # Change to the individual's directory using absolute path
-            os.chdir(self.directory)
-            
-            # Get Python path
-            if sys.platform == "win32":
-                venv_python = os.path.join(self.directory, "venv", "Scripts", "python.exe")
-            else:
-                venv_python = os.path.join(self.directory, "venv", "bin", "python")
-            
+            venv_python = self.venv_python
             if not os.path.exists(venv_python):
                 raise FileNotFoundError(f"Python executable not found at {venv_python}")
             
@@ -85,10 +149,18 @@ class Individual:
             if not os.path.exists(requirements_path):
                 raise FileNotFoundError(f"Requirements file not found at {requirements_path}")
             
+            if self.wheelhouse is not None:
+                # Install offline from the shared wheelhouse
+                print(f"Installing requirements from {requirements_path} using wheelhouse...")
+                self.wheelhouse.install(venv_python, requirements_path)
+                print(f"Successfully installed requirements")
+                return
+
             # Install requirements using python -m pip instead of direct pip executable
             print(f"Installing requirements from {requirements_path}...")
             result = subprocess.run(
                 [venv_python, "-m", "pip", "install", "-r", requirements_path],
+                cwd=self.directory,
                 capture_output=True,
                 text=True,
                 check=False
@@ -103,45 +175,30 @@ class Individual:
         except Exception as e:
             print(f"Error in install_requirements: {str(e)}")
             raise
-        finally:
-            os.chdir(current_dir)
 
-    def setup(self):
-        current_dir = os.getcwd()
+    def create_venv(self):
+        # Create virtual environment
+        print(f"Creating virtual environment in {self.venv_dir}...")
+        venv_result = subprocess.run([sys.executable, "-m", "venv", self.venv_dir], 
+                                    capture_output=True, 
+                                    text=True,
+                                    check=False)
         
-        try:
-            # Ensure the directory exists
-            if not os.path.exists(self.directory):
-                raise FileNotFoundError(f"Individual directory not found: {self.directory}")
-                
-            # Change to the individual's directory using absolute path
-            os.chdir(self.directory)
+        if venv_result.returncode != 0:
+            print(f"Error creating venv: {venv_result.stderr}")
+            raise RuntimeError(f"Failed to create virtual environment: {venv_result.stderr}")
             
-            # Create virtual environment
-            print(f"Creating virtual environment in {self.directory}...")
-            venv_result = subprocess.run([sys.executable, "-m", "venv", "venv"], 
-                                        capture_output=True, 
-                                        text=True,
-                                        check=False)
+        python_exe = self.venv_python
+        if not os.path.exists(python_exe):
+            print(f"Python executable not found at {python_exe}")
+            available_files = os.listdir(os.path.dirname(python_exe))
+            print(f"Available files in {os.path.dirname(python_exe)}: {available_files}")
+            raise FileNotFoundError(f"Python executable not found in the virtual environment")
             
-            if venv_result.returncode != 0:
-                print(f"Error creating venv: {venv_result.stderr}")
-                raise RuntimeError(f"Failed to create virtual environment: {venv_result.stderr}")
-                
-            # Ensure pip is available by upgrading it first
-            if sys.platform == "win32":
-                python_exe = os.path.join(self.directory, "venv", "Scripts", "python.exe")
-            else:
-                python_exe = os.path.join(self.directory, "venv", "bin", "python")
-                
-            if not os.path.exists(python_exe):
-                print(f"Python executable not found at {python_exe}")
-                available_files = os.listdir(os.path.dirname(python_exe))
-                print(f"Available files in {os.path.dirname(python_exe)}: {available_files}")
-                raise FileNotFoundError(f"Python executable not found in the virtual environment")
-                
-            # Upgrade pip to ensure it's available and properly installed
-            print(f"Upgrading pip in {self.directory}...")
+        # Upgrade pip to ensure it's available and properly installed,
+        # installs from a wheelhouse work with the bundled pip and skip this
+        if self.wheelhouse is None:
+            print(f"Upgrading pip in {self.venv_dir}...")
             upgrade_pip = subprocess.run(
                 [python_exe, "-m", "pip", "install", "--upgrade", "pip"],
                 capture_output=True,
@@ -152,54 +209,60 @@ class Individual:
             if upgrade_pip.returncode != 0:
                 print(f"Error upgrading pip: {upgrade_pip.stderr}")
                 # Continue anyway, as pip might still work
-            
-            # Install requirements
+
+    def prepare_venv(self):
+        """
+        Make sure the individual has an installed venv: keep an inherited one, take one from
+        the shared pool, or create and install its own.
+        """
+        if os.path.exists(self.venv_python):
+            print(f"Reusing virtual environment {self.venv_dir}")
+        elif self.venv_pool is not None:
+            self.venv_pool.acquire(self)
+        else:
+            self.create_venv()
             self.install_requirements()
-            
-            # Copy fitness.py from environment using absolute paths
-            src_fitness = os.path.join(current_dir, "environment", "fitness.py")
-            
-            # Check if the source fitness.py file exists
-            if not os.path.exists(src_fitness):
-                print(f"Source fitness.py not found at {src_fitness}")
-                print(f"Current directory: {current_dir}")
-                print(f"Environment directory content: {os.listdir(os.path.join(current_dir, 'environment')) if os.path.exists(os.path.join(current_dir, 'environment')) else 'Environment directory not found'}")
-                raise FileNotFoundError(f"Source fitness.py not found at {src_fitness}")
-                
-            dst_fitness = os.path.join(self.directory, "fitness.py")
-            print(f"Copying fitness.py from {src_fitness} to {dst_fitness}")
-            with open(src_fitness, "r", encoding="utf-8") as src:
-                with open(dst_fitness, "w", encoding="utf-8") as dst:
-                    dst.write(src.read())
-            
-            # Test fitness
-            self.test_fitness()
-            
-            return True
+        self.update_data(venv=self.venv_dir)
+
+    @synchronized
+    def setup(self):
+        # Ensure the directory exists
+        if not os.path.exists(self.directory):
+            raise FileNotFoundError(f"Individual directory not found: {self.directory}")
 
-        finally:
-            os.chdir(current_dir)
+        self.prepare_venv()
+        
+        # Test fitness, a failed evaluation fails the setup
+        return self.test_fitness()
+    @synchronized
     def load_fitness(self):
         with open(os.path.join(self.directory, "data.json"), "r") as f:
             data = json.load(f)
         self.fitness = float(data["score"])
+        runtimes = data.get("runtimes") or []
+        genotype_path = os.path.join(self.directory, "genotype.py")
+        # Only the keys measured here, layers such as SmartTournament add their own
+        self.objectives.update({
+            "score": self.fitness,
+            "runtime": runtimes[-1] if runtimes else None,
+            "code_size": os.path.getsize(genotype_path) if os.path.exists(genotype_path) else None,
+        })
     
+    @synchronized
     def reset_attributes(self, prompt: str, genotype: str, requirements: str):
-        current_dir = os.getcwd()
-        
-        try:
-            os.chdir(self.directory)
-            
-            # Write files using absolute paths
-            with open(os.path.join(self.directory, "prompt.md"), "w", encoding="utf-8") as f:
-                f.write(prompt)
-            with open(os.path.join(self.directory, "genotype.py"), "w", encoding="utf-8") as f:
-                f.write(genotype)
-            with open(os.path.join(self.directory, "requirements.txt"), "w", encoding="utf-8") as f:
-                f.write(requirements)
-                
-            # Install requirements and test fitness
-            self.install_requirements()
-            self.test_fitness()
-        finally:
-            os.chdir(current_dir)
\ No newline at end of file
+        # Only rewrite the files that changed
+        write_if_changed(os.path.join(self.directory, "prompt.md"), prompt)
+        write_if_changed(os.path.join(self.directory, "genotype.py"), genotype)
+        requirements_changed = write_if_changed(os.path.join(self.directory, "requirements.txt"), requirements)
+
+        # Reinstall only for new requirements, a shared venv is swapped rather than modified
+        if requirements_changed:
+            if self.venv_pool is not None:
+                self.venv_pool.acquire(self)
+                self.update_data(venv=self.venv_dir)
+            elif self.shares_venv:
+                self.venv_dir = os.path.join(self.directory, "venv")
+                self.prepare_venv()
+            else:
+                self.install_requirements()
+        return self.test_fitness()
\ No newline at end of file
@@ -0,0 +1,187 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS individuals (
+    id TEXT PRIMARY KEY,
+    generation INTEGER,
+    operator TEXT,
+    prompt_hash TEXT,
+    fitness REAL,
+    alive INTEGER DEFAULT 1,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS parents (
+    child_id TEXT,
+    parent_id TEXT,
+    PRIMARY KEY (child_id, parent_id)
+);
+CREATE INDEX IF NOT EXISTS parents_by_parent ON parents (parent_id);
+CREATE INDEX IF NOT EXISTS individuals_by_fitness ON individuals (fitness);
+CREATE INDEX IF NOT EXISTS individuals_by_operator ON individuals (operator);
+CREATE INDEX IF NOT EXISTS individuals_by_prompt ON individuals (prompt_hash);
+"""
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class LineageStore:
+    def __init__(self, path: str):
+        """
+        Indexed genealogy of every individual ever created, dead or alive, in SQLite.
+
+        Args:
+            path: Path of the database file, ":memory:" for a throwaway store
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def record(self, idstr: str, prompt: str, generation: int, operator: str = None, parent_ids: list[str] = None, fitness: float = None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO individuals (id, generation, operator, prompt_hash, fitness, alive, created) VALUES (?, ?, ?, ?, ?, 1, ?)",
+                (idstr, generation, operator, prompt_hash(prompt), fitness, time.time()),
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO parents (child_id, parent_id) VALUES (?, ?)",
+                [(idstr, parent_id) for parent_id in parent_ids or []],
+            )
+
+    def update(self, idstr: str, fitness: float = None, prompt: str = None):
+        with self.lock, self.connection:
+            if fitness is not None:
+                self.connection.execute("UPDATE individuals SET fitness = ? WHERE id = ?", (fitness, idstr))
+            if prompt is not None:
+                self.connection.execute("UPDATE individuals SET prompt_hash = ? WHERE id = ?", (prompt_hash(prompt), idstr))
+
+    def record_mutation(self, idstr: str, prompt: str, generation: int, operator: str, fitness: float = None) -> Optional[str]:
+        """
+        Record an in-place mutation as a new version of an individual.
+
+        The state before the mutation is kept as a dead row with id "<id>@<n>", holding the
+        original operator, fitness, parents and the children bred from it. The individual's
+        own row becomes its child, credited to operator with the new fitness, so
+        operator_success_rate compares the mutation against what it replaced.
+
+        Returns:
+            The id of the pre-mutation version, None if the individual was never recorded
+        """
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT * FROM individuals WHERE id = ?", (idstr,)).fetchone()
+            if row is None:
+                return None
+            prefix = f"{idstr}@"
+            versions = self.connection.execute("SELECT COUNT(*) FROM individuals WHERE substr(id, 1, ?) = ?", (len(prefix), prefix)).fetchone()[0]
+            previous = f"{prefix}{versions}"
+            self.connection.execute(
+                "INSERT INTO individuals (id, generation, operator, prompt_hash, fitness, alive, created) VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (previous, row["generation"], row["operator"], row["prompt_hash"], row["fitness"], row["created"]),
+            )
+            # Everything bred so far came from the pre-mutation version
+            self.connection.execute("UPDATE parents SET child_id = ? WHERE child_id = ?", (previous, idstr))
+            self.connection.execute("UPDATE parents SET parent_id = ? WHERE parent_id = ?", (previous, idstr))
+            self.connection.execute("INSERT INTO parents (child_id, parent_id) VALUES (?, ?)", (idstr, previous))
+            self.connection.execute(
+                "UPDATE individuals SET generation = ?, operator = ?, prompt_hash = ?, fitness = ?, created = ? WHERE id = ?",
+                (generation, operator, prompt_hash(prompt), fitness, time.time(), idstr),
+            )
+        return previous
+
+    def mark_dead(self, idstr: str):
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE individuals SET alive = 0 WHERE id = ?", (idstr,))
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self.lock:
+            return [dict(row) for row in self.connection.execute(sql, params).fetchall()]
+
+    def get(self, idstr: str) -> Optional[dict]:
+        rows = self._query("SELECT * FROM individuals WHERE id = ?", (idstr,))
+        return rows[0] if rows else None
+
+    def best(self, n: int = 1, alive_only: bool = False) -> list[dict]:
+        where = "WHERE fitness IS NOT NULL" + (" AND alive = 1" if alive_only else "")
+        return self._query(f"SELECT * FROM individuals {where} ORDER BY fitness DESC LIMIT ?", (n,))
+
+    def parents(self, idstr: str) -> list[str]:
+        return [row["parent_id"] for row in self._query("SELECT parent_id FROM parents WHERE child_id = ?", (idstr,))]
+
+    def children(self, idstr: str) -> list[str]:
+        return [row["child_id"] for row in self._query("SELECT child_id FROM parents WHERE parent_id = ?", (idstr,))]
+
+    def ancestors(self, idstr: str, max_depth: Optional[int] = None) -> list[dict]:
+        """
+        Every ancestor of an individual with its distance, nearest first, using a recursive query.
+        """
+        depth_limit = "" if max_depth is None else "WHERE a.depth < ?"
+        params = (idstr,) if max_depth is None else (idstr, max_depth)
+        return self._query(f"""
+            WITH RECURSIVE ancestry(id, depth) AS (
+                SELECT parent_id, 1 FROM parents WHERE child_id = ?
+                UNION
+                SELECT p.parent_id, a.depth + 1 FROM parents p JOIN ancestry a ON p.child_id = a.id {depth_limit}
+            )
+            SELECT i.*, MIN(a.depth) AS depth FROM ancestry a JOIN individuals i ON i.id = a.id
+            GROUP BY i.id ORDER BY depth, i.fitness DESC
+        """, params)
+
+    def ancestors_of_best(self, max_depth: Optional[int] = None) -> list[dict]:
+        best = self.best(1)
+        return self.ancestors(best[0]["id"], max_depth) if best else []
+
+    def operator_success_rate(self) -> dict[str, dict]:
+        """
+        For every operator, how many children it made and how many beat their best parent.
+        Children without parents (e.g. from Populate) count as successes when they have a fitness.
+        """
+        rows = self._query("""
+            SELECT c.operator AS operator,
+                   COUNT(*) AS children,
+                   SUM(CASE WHEN c.fitness > COALESCE(best_parent.fitness, -1e308) THEN 1 ELSE 0 END) AS improved
+            FROM individuals c
+            LEFT JOIN (
+                SELECT p.child_id AS child_id, MAX(i.fitness) AS fitness
+                FROM parents p JOIN individuals i ON i.id = p.parent_id
+                GROUP BY p.child_id
+            ) best_parent ON best_parent.child_id = c.id
+            WHERE c.fitness IS NOT NULL
+            GROUP BY c.operator
+        """)
+        return {
+            row["operator"]: {"children": row["children"], "improved": row["improved"], "rate": row["improved"] / row["children"]}
+            for row in rows
+        }
+
+    def fitness_delta_by_parent_pair(self, limit: int = 100) -> list[dict]:
+        """
+        Mean fitness of children minus the better parent, per unordered parent pair, best pairs first.
+        """
+        return self._query("""
+            WITH pairs AS (
+                SELECT a.child_id AS child_id, a.parent_id AS parent_a, b.parent_id AS parent_b
+                FROM parents a JOIN parents b ON a.child_id = b.child_id AND a.parent_id < b.parent_id
+            )
+            SELECT parent_a, parent_b, COUNT(*) AS children,
+                   AVG(c.fitness - MAX(pa.fitness, pb.fitness)) AS mean_delta
+            FROM pairs
+            JOIN individuals c ON c.id = pairs.child_id
+            JOIN individuals pa ON pa.id = pairs.parent_a
+            JOIN individuals pb ON pb.id = pairs.parent_b
+            WHERE c.fitness IS NOT NULL AND pa.fitness IS NOT NULL AND pb.fitness IS NOT NULL
+            GROUP BY parent_a, parent_b
+            ORDER BY mean_delta DESC
+            LIMIT ?
+        """, (limit,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,6 +1,8 @@
 import os
+import threading
 from typing import Dict, List, Optional, Union, Any
 from openai import OpenAI
+from budget import TokenBudget
 
 class LLMBase:
     """
@@ -12,11 +14,20 @@ class LLMBase:
         self,
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
+        budget: Optional[TokenBudget] = None,
     ):
         """
         Initialize the LLM client with custom settings.
         
+        Args:
+            api_key: API key, defaults to OPENAI_API_KEY
+            base_url: Backend URL, defaults to OPENAI_BASE_URL
+            budget: Optional TokenBudget that every completion is charged to
         """
+        self.budget = budget
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.cache_stats = {"prompt_tokens": 0, "cached_tokens": 0, "calls": 0}
 
         # Use provided values or fall back to environment variables
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
@@ -38,6 +49,7 @@ class LLMBase:
         model: Optional[str] = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        source: Optional[str] = None,
         **kwargs
     ) -> str:
         """
@@ -48,6 +60,7 @@ class LLMBase:
             model: Override default model
             temperature: Override default temperature
             max_tokens: Override default max_tokens
+            source: Name of the caller, used to attribute token usage in the budget
             **kwargs: Additional parameters to pass to the API
             
         Returns:
@@ -61,11 +74,53 @@ class LLMBase:
             "messages": messages,
             **kwargs
         }
+        if self.budget is not None:
+            self.budget.check()
+            max_tokens = self.budget.max_tokens(max_tokens)
+        if max_tokens is not None:
+            completion_kwargs["max_tokens"] = max_tokens
         
         try:
             response = self.client.chat.completions.create(**completion_kwargs)
-            return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"Error in chat completion: {str(e)}")
+
+        self._local.last_usage = self.extract_usage(response)
+        if self._local.last_usage is not None:
+            with self._lock:
+                self.cache_stats["prompt_tokens"] += self._local.last_usage["prompt_tokens"]
+                self.cache_stats["cached_tokens"] += self._local.last_usage["cached_tokens"]
+                self.cache_stats["calls"] += 1
+        if self.budget is not None:
+            self.budget.record(source, self._local.last_usage)
+        return response.choices[0].message.content
+
+    @staticmethod
+    def extract_usage(response) -> Optional[Dict[str, int]]:
+        """Read token counts from the usage field of a completion response, if the backend reports it."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        # OpenAI reports prefix cache hits in prompt_tokens_details, DeepSeek-style backends as prompt_cache_hit_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", 0)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cached_tokens": cached or 0,
+        }
+
+    def cache_hit_rate(self) -> Optional[float]:
+        """Fraction of prompt tokens served from the provider's prefix cache, None if nothing was reported."""
+        if not self.cache_stats["prompt_tokens"]:
+            return None
+        return self.cache_stats["cached_tokens"] / self.cache_stats["prompt_tokens"]
+
+    @property
+    def last_usage(self) -> Optional[Dict[str, int]]:
+        """Usage of the last completion made from the calling thread."""
+        return getattr(self._local, "last_usage", None)
     
     
\ No newline at end of file
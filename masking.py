@@ -0,0 +1,157 @@
+import re
+import numpy as np
+from typing import Optional
+
+MASK_TOKEN = "[MASK]"
+
+# Regexes that split a prompt into maskable units for each granularity.
+# Everything between two matches is kept as a separator so that the
+# unmasked parts of a prompt keep their original spacing and newlines.
+GRANULARITY_PATTERNS = {
+    "char": re.compile(r".", re.DOTALL),
+    "token": re.compile(r"\w+|[^\w\s]"),
+    "word": re.compile(r"\S+"),
+    "line": re.compile(r"[^\n]+"),
+}
+
+
+class MaskStats:
+    """Summary of a single masking batch, useful for tuning mask_rate and mask_size."""
+    def __init__(self, prompts: int, units: int, masked_units: int, spans: int):
+        self.prompts = prompts
+        self.units = units
+        self.masked_units = masked_units
+        self.spans = spans
+
+    @property
+    def mask_fraction(self) -> float:
+        return self.masked_units / self.units if self.units else 0.0
+
+    @property
+    def mean_span(self) -> float:
+        return self.masked_units / self.spans if self.spans else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "prompts": self.prompts,
+            "units": self.units,
+            "masked_units": self.masked_units,
+            "spans": self.spans,
+            "mask_fraction": self.mask_fraction,
+            "mean_span": self.mean_span,
+        }
+
+    def __repr__(self):
+        return (f"MaskStats(prompts={self.prompts}, units={self.units}, masked_units={self.masked_units}, "
+                f"spans={self.spans}, mask_fraction={self.mask_fraction:.3f}, mean_span={self.mean_span:.2f})")
+
+
+class MaskingEngine:
+    def __init__(self, mask_rate: float = 0.3, mask_size: range = range(1, 10), granularity: str = "word", seed: Optional[int] = None):
+        """
+        Build masks for whole batches of prompts from vectorized random draws.
+
+        Args:
+            mask_rate: The probability that a span of masked units starts at any given unit
+            mask_size: The range of span lengths (in units) to draw from
+            granularity: One of "char", "token", "word" or "line"
+            seed: Seed for the random generator, makes masking reproducible
+        """
+        if granularity not in GRANULARITY_PATTERNS:
+            raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITY_PATTERNS)}")
+        self.mask_rate = mask_rate
+        self.mask_size = mask_size
+        self.granularity = granularity
+        self.rng = np.random.default_rng(seed)
+        self.history: list[MaskStats] = []
+
+    def configure(self, mask_rate: Optional[float] = None, mask_size: Optional[range] = None, granularity: Optional[str] = None) -> "MaskingEngine":
+        """Update the masking settings in place, keeping the random stream (and statistics) intact."""
+        if granularity is not None:
+            if granularity not in GRANULARITY_PATTERNS:
+                raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(GRANULARITY_PATTERNS)}")
+            self.granularity = granularity
+        if mask_rate is not None:
+            self.mask_rate = mask_rate
+        if mask_size is not None:
+            self.mask_size = mask_size
+        return self
+
+    def mask(self, prompt: str) -> str:
+        return self.mask_batch([prompt])[0]
+
+    def mask_batch(self, prompts: list[str]) -> list[str]:
+        """
+        Mask every prompt in the batch.
+
+        Span starts and span lengths for all units of all prompts are drawn at once.
+        A unit is covered when any earlier span in the same prompt reaches it, which is
+        computed with a running maximum over the (clipped) span end positions.
+        Consecutive covered units collapse into a single [MASK] token.
+
+        Args:
+            prompts: The prompts to mask
+
+        Returns:
+            The masked prompts, in the same order
+        """
+        pattern = GRANULARITY_PATTERNS[self.granularity]
+        units = [list(pattern.finditer(prompt)) for prompt in prompts]
+        counts = np.array([len(u) for u in units], dtype=np.int64)
+        total = int(counts.sum())
+        if total == 0:
+            self.history.append(MaskStats(len(prompts), 0, 0, 0))
+            return list(prompts)
+
+        # Position of every unit in the flattened batch and the end of the prompt it belongs to
+        ends = np.cumsum(counts)
+        prompt_end = np.repeat(ends, counts)
+        positions = np.arange(total)
+
+        starts = self.rng.random(total) < self.mask_rate
+        sizes = self.rng.choice(np.asarray(self.mask_size), size=total)
+        span_end = np.where(starts, np.minimum(positions + sizes, prompt_end), 0)
+        covered = np.maximum.accumulate(span_end) > positions
+
+        # A span begins where a covered unit follows an uncovered one or a prompt boundary
+        prompt_start = prompt_end - np.repeat(counts, counts)
+        run_start = covered & ((positions == prompt_start) | ~np.roll(covered, 1))
+
+        masked_prompts = []
+        offset = 0
+        for prompt, matches in zip(prompts, units):
+            masked_prompts.append(self._render(prompt, matches, covered[offset:offset + len(matches)]))
+            offset += len(matches)
+
+        self.history.append(MaskStats(len(prompts), total, int(covered.sum()), int(run_start.sum())))
+        return masked_prompts
+
+    def _render(self, prompt: str, matches: list, covered: np.ndarray) -> str:
+        # Separators between units are whitespace only, so they are kept everywhere
+        # except inside a masked run, where the run collapses to one [MASK].
+        parts = []
+        cursor = 0
+        previous_covered = False
+        for match, is_covered in zip(matches, covered):
+            if not (is_covered and previous_covered):
+                parts.append(prompt[cursor:match.start()])
+            if not is_covered:
+                parts.append(match.group())
+            elif not previous_covered:
+                parts.append(MASK_TOKEN)
+            previous_covered = is_covered
+            cursor = match.end()
+        parts.append(prompt[cursor:])
+        return "".join(parts)
+
+    @property
+    def last_stats(self) -> Optional[MaskStats]:
+        return self.history[-1] if self.history else None
+
+    def summary(self) -> dict:
+        """Aggregate statistics over every batch masked so far."""
+        prompts = sum(s.prompts for s in self.history)
+        units = sum(s.units for s in self.history)
+        masked_units = sum(s.masked_units for s in self.history)
+        spans = sum(s.spans for s in self.history)
+        return MaskStats(prompts, units, masked_units, spans).as_dict()
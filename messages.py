@@ -0,0 +1,41 @@
+class MessageLayout:
+    def __init__(self, system_prompt: str):
+        """
+        Assemble chat messages so that stable content forms a byte-identical prefix.
+
+        Provider-side prefix caches only hit when the start of the request is exactly
+        the same as an earlier one. The system prompt and stable blocks (schematic,
+        examples, ...) are therefore rendered first, in insertion order, and the
+        variable part of a request always comes last.
+
+        Args:
+            system_prompt: The agent's system prompt
+        """
+        self.system_prompt = system_prompt
+        self.blocks: dict[str, str] = {}
+        self._prefix = None
+
+    def set_block(self, name: str, content: str) -> bool:
+        """
+        Add or replace a stable block.
+
+        Returns:
+            True if the prefix changed, which invalidates any cached prefix on the provider
+        """
+        if self.blocks.get(name) == content:
+            return False
+        self.blocks[name] = content
+        self._prefix = None
+        return True
+
+    def prefix(self) -> list[dict]:
+        if self._prefix is None:
+            content = self.system_prompt
+            for name, block in self.blocks.items():
+                content += f"\n\n## {name}\n{block}"
+            self._prefix = [{'role': 'system', 'content': content}]
+        return self._prefix
+
+    def build(self, history: list[dict]) -> list[dict]:
+        """The full message list: cacheable prefix followed by the conversation history."""
+        return self.prefix() + history
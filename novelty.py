@@ -0,0 +1,120 @@
+import re
+import zlib
+import threading
+import numpy as np
+from typing import Optional
+
+WORD = re.compile(r"\w+")
+
+
+class NoveltyArchive:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 0):
+        """
+        An archive of every prompt seen so far, indexed with MinHash and LSH.
+
+        Prompts are reduced to word shingles, hashed into a MinHash signature, and the
+        signature is split into bands that are bucketed. Lookups only compare against
+        prompts that share at least one bucket, so they stay fast with tens of thousands
+        of archived prompts, and everything runs locally without embeddings from a network.
+
+        Args:
+            threshold: Estimated Jaccard similarity at or above which a prompt counts as a clone
+            num_perm: Number of hash permutations in a signature
+            bands: Number of LSH bands, num_perm must be divisible by it
+            shingle_size: Number of consecutive words per shingle
+            seed: Seed for the hash permutations
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, products wrap modulo 2^64
+        self.a = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.b = rng.integers(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True)
+        self.signatures: dict[str, np.ndarray] = {}
+        self.buckets: list[dict[bytes, set[str]]] = [{} for _ in range(bands)]
+        self.lock = threading.RLock()
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = WORD.findall(text.lower())
+        if len(words) < self.shingle_size:
+            grams = [" ".join(words)] if words else [""]
+        else:
+            grams = [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+        return np.array(sorted({zlib.crc32(g.encode("utf-8")) for g in grams}), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self.a) + self.b) >> np.uint64(32)
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key: str, text: str) -> np.ndarray:
+        """Archive a prompt under key, replacing any prompt previously stored under it."""
+        signature = self.signature(text)
+        with self.lock:
+            self.remove(key)
+            self.signatures[key] = signature
+            for band, band_key in zip(self.buckets, self._band_keys(signature)):
+                band.setdefault(band_key, set()).add(key)
+        return signature
+
+    def remove(self, key: str):
+        with self.lock:
+            signature = self.signatures.pop(key, None)
+            if signature is None:
+                return
+            for band, band_key in zip(self.buckets, self._band_keys(signature)):
+                members = band.get(band_key)
+                if members:
+                    members.discard(key)
+                    if not members:
+                        del band[band_key]
+
+    def nearest(self, text: str, k: int = 1, exclude: Optional[str] = None) -> list[tuple[str, float]]:
+        """
+        The k most similar archived prompts among the LSH candidates.
+
+        Returns:
+            A list of (key, estimated Jaccard similarity), most similar first
+        """
+        signature = self.signature(text)
+        with self.lock:
+            candidates = set()
+            for band, band_key in zip(self.buckets, self._band_keys(signature)):
+                candidates |= band.get(band_key, set())
+            candidates.discard(exclude)
+            if not candidates:
+                return []
+            keys = list(candidates)
+            stacked = np.stack([self.signatures[key] for key in keys])
+        similarities = (stacked == signature).mean(axis=1)
+        order = np.argsort(-similarities)[:k]
+        return [(keys[i], float(similarities[i])) for i in order]
+
+    def is_novel(self, text: str, exclude: Optional[str] = None) -> bool:
+        """False if the nearest archived prompt is within the similarity threshold."""
+        nearest = self.nearest(text, 1, exclude)
+        return not nearest or nearest[0][1] < self.threshold
+
+    def novelty(self, text: str, k: int = 5, exclude: Optional[str] = None) -> float:
+        """
+        Novelty score in [0, 1]: one minus the mean similarity to the k nearest archived prompts.
+        Prompts that share no LSH bucket with anything are fully novel.
+        """
+        nearest = self.nearest(text, k, exclude)
+        if not nearest:
+            return 1.0
+        return 1.0 - sum(similarity for _, similarity in nearest) / len(nearest)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key: str):
+        return key in self.signatures
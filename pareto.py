@@ -0,0 +1,103 @@
+import math
+from typing import Sequence
+
+# (objective name, maximize) pairs, read from Individual.objectives
+DEFAULT_OBJECTIVES = (("score", True), ("runtime", False), ("code_size", False))
+
+
+def objective_vector(objectives: dict, spec: Sequence[tuple[str, bool]] = DEFAULT_OBJECTIVES) -> list[float]:
+    """
+    Turn an objectives dict into a vector where larger is always better.
+    Missing or non-numeric objectives count as the worst possible value.
+    """
+    vector = []
+    for name, maximize in spec:
+        value = objectives.get(name)
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            value = -math.inf if maximize else math.inf
+        vector.append(value if maximize else -value)
+    return vector
+
+
+def dominates(a: Sequence[float], b: Sequence[float]) -> bool:
+    """True if a is at least as good as b everywhere and strictly better somewhere (larger is better)."""
+    better = False
+    for x, y in zip(a, b):
+        if x < y:
+            return False
+        if x > y:
+            better = True
+    return better
+
+
+def fast_non_dominated_sort(vectors: list[Sequence[float]]) -> list[list[int]]:
+    """
+    NSGA-II fast non-dominated sort.
+
+    Args:
+        vectors: Objective vectors where larger is better in every dimension
+
+    Returns:
+        Fronts as lists of indices into vectors, best front first
+    """
+    dominated_by = [[] for _ in vectors]
+    domination_count = [0] * len(vectors)
+    fronts = [[]]
+    for p in range(len(vectors)):
+        for q in range(p + 1, len(vectors)):
+            if dominates(vectors[p], vectors[q]):
+                dominated_by[p].append(q)
+                domination_count[q] += 1
+            elif dominates(vectors[q], vectors[p]):
+                dominated_by[q].append(p)
+                domination_count[p] += 1
+    fronts[0] = [p for p in range(len(vectors)) if domination_count[p] == 0]
+
+    while fronts[-1]:
+        next_front = []
+        for p in fronts[-1]:
+            for q in dominated_by[p]:
+                domination_count[q] -= 1
+                if domination_count[q] == 0:
+                    next_front.append(q)
+        fronts.append(next_front)
+    return fronts[:-1]
+
+
+def crowding_distance(vectors: list[Sequence[float]], front: list[int]) -> dict[int, float]:
+    """
+    Crowding distance of every member of a front. Boundary points get infinity.
+    Dimensions with a non-finite range are skipped.
+    """
+    distance = {i: 0.0 for i in front}
+    if len(front) <= 2:
+        return {i: math.inf for i in front}
+    for m in range(len(vectors[front[0]])):
+        ordered = sorted(front, key=lambda i: vectors[i][m])
+        low, high = vectors[ordered[0]][m], vectors[ordered[-1]][m]
+        distance[ordered[0]] = distance[ordered[-1]] = math.inf
+        span = high - low
+        if span == 0 or not math.isfinite(span):
+            continue
+        for previous, current, following in zip(ordered, ordered[1:], ordered[2:]):
+            gap = vectors[following][m] - vectors[previous][m]
+            if math.isfinite(gap):
+                distance[current] += gap / span
+    return distance
+
+
+def pareto_rank(vectors: list[Sequence[float]]) -> list[tuple[int, float]]:
+    """(front index, crowding distance) for every vector."""
+    ranks = [(0, 0.0)] * len(vectors)
+    for front_index, front in enumerate(fast_non_dominated_sort(vectors)):
+        for i, distance in crowding_distance(vectors, front).items():
+            ranks[i] = (front_index, distance)
+    return ranks
+
+
+def nsga2_sort(individuals: list, objectives: Sequence[tuple[str, bool]] = DEFAULT_OBJECTIVES) -> list:
+    """Individuals ordered by front, then by descending crowding distance."""
+    vectors = [objective_vector(ind.objectives, objectives) for ind in individuals]
+    ranks = pareto_rank(vectors)
+    order = sorted(range(len(individuals)), key=lambda i: (ranks[i][0], -ranks[i][1]))
+    return [individuals[i] for i in order]
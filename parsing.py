@@ -0,0 +1,136 @@
+import re
+from typing import Optional
+
+FENCE_PATTERN = re.compile(r"```[\w+\-.]*[ \t]*\n?(.*?)```", re.DOTALL)
+
+
+class ParseError(ValueError):
+    """Raised when an agent response is missing tags or contains invalid code."""
+    def __init__(self, message: str, missing: list[str] = None, invalid: dict[str, str] = None, parsed: dict[str, str] = None):
+        super().__init__(message)
+        self.missing = missing or []
+        self.invalid = invalid or {}
+        # Tags that did parse, so a re-ask only has to ask for the rest
+        self.parsed = parsed or {}
+
+    @property
+    def failed_tags(self) -> list[str]:
+        return self.missing + [tag for tag in self.invalid if tag not in self.missing]
+
+
+def _tag_pattern(tags: list[str]) -> re.Pattern:
+    names = "|".join(re.escape(tag) for tag in sorted(set(tags), key=len, reverse=True))
+    return re.compile(rf"<(/?)({names})(?:\s[^<>]*)?>")
+
+
+def _scan(text: str, tags: list[str]) -> tuple[dict[str, str], dict[str, int]]:
+    found = {}
+    open_at = {}
+    for match in _tag_pattern(tags).finditer(text):
+        closing, tag = match.group(1), match.group(2)
+        if tag in found:
+            continue
+        if not closing:
+            open_at.setdefault(tag, match.end())
+        elif tag in open_at:
+            found[tag] = text[open_at[tag]:match.start()]
+    return found, open_at
+
+
+def _missing_error(tags: list[str], found: dict, open_at: dict) -> Optional[ParseError]:
+    missing = [tag for tag in tags if tag not in found]
+    if not missing:
+        return None
+    details = ", ".join(f"<{tag}>" + (" (not closed)" if tag in open_at else "") for tag in missing)
+    return ParseError(f"Missing tags in response: {details}", missing=missing)
+
+
+def extract_tags(text: str, tags: list[str]) -> dict[str, str]:
+    """
+    Extract the contents of every requested tag in a single pass over the text.
+
+    The first complete <tag>...</tag> pair wins. Tags that never open, or open
+    without closing, are reported together in one ParseError.
+
+    Args:
+        text: The raw response text
+        tags: The tag names to extract
+
+    Returns:
+        A dict mapping each tag to its content
+    """
+    found, open_at = _scan(text, tags)
+    error = _missing_error(tags, found, open_at)
+    if error:
+        raise error
+    return found
+
+
+def extract_all(text: str, tag: str) -> list[str]:
+    """Return the contents of every complete <tag>...</tag> pair, in order."""
+    results = []
+    start = None
+    for match in _tag_pattern([tag]).finditer(text):
+        if not match.group(1):
+            start = match.end()
+        elif start is not None:
+            results.append(text[start:match.start()])
+            start = None
+    return results
+
+
+def strip_code_fences(code: str) -> str:
+    """
+    Remove markdown code fences. If the text contains fenced blocks, their bodies are
+    joined in order, e.g. imports and implementation sent as two blocks, and any prose
+    between them is dropped. Otherwise the text is returned with surrounding blank lines removed.
+    """
+    blocks = FENCE_PATTERN.findall(code)
+    if blocks:
+        code = "\n".join(block.strip("\n") for block in blocks)
+    return code.strip("\n").rstrip() + "\n" if code.strip() else ""
+
+
+def validate_python(code: str, filename: str = "<genotype>") -> Optional[str]:
+    """
+    Compile the code without running it.
+
+    Returns:
+        None if the code compiles, otherwise a short description of the syntax error
+    """
+    try:
+        compile(code, filename, "exec")
+    except SyntaxError as e:
+        return f"SyntaxError: {e.msg} (line {e.lineno})"
+    except ValueError as e:
+        return f"ValueError: {e}"
+    return None
+
+
+def parse_response(text: str, tags: list[str], code_tags: list[str] = None) -> dict[str, str]:
+    """
+    Extract tags and validate the ones that must contain Python code.
+
+    Code tags have their fences stripped and are compiled; failures are collected
+    into a single ParseError so that a re-ask can target exactly the broken tags.
+    """
+    code_tags = code_tags or []
+    found, open_at = _scan(text, tags)
+    error = _missing_error(tags, found, open_at)
+    missing = error.missing if error else []
+
+    invalid = {}
+    for tag in code_tags:
+        if found.get(tag) is None:
+            continue
+        found[tag] = strip_code_fences(found[tag])
+        error = validate_python(found[tag])
+        if error:
+            invalid[tag] = error
+
+    if missing or invalid:
+        problems = [f"<{tag}> is missing or not closed" for tag in missing]
+        problems += [f"<{tag}> does not compile: {error}" for tag, error in invalid.items()]
+        parsed = {tag: value for tag, value in found.items() if tag not in invalid}
+        raise ParseError("; ".join(problems), missing=missing, invalid=invalid, parsed=parsed)
+    return found
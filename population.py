@@ -0,0 +1,98 @@
+import threading
+from typing import Callable, Iterable, Iterator
+
+
+class Population:
+    def __init__(self, individuals: Iterable = ()):
+        """
+        The living individuals of an Environment, safe to change from several threads.
+
+        Every change (add, remove, replace, cap, sort) happens atomically under one lock,
+        and iteration walks a snapshot, so a layer selecting parents never sees a list
+        that another layer is halfway through sorting or capping.
+        """
+        self._individuals = list(individuals)
+        self.lock = threading.RLock()
+
+    def snapshot(self) -> list:
+        """A copy of the current members in order, for selection and iteration."""
+        with self.lock:
+            return list(self._individuals)
+
+    def add(self, individual):
+        with self.lock:
+            self._individuals.append(individual)
+
+    # Lets existing code that treats the population as a list keep working
+    append = add
+
+    def remove(self, individual) -> bool:
+        with self.lock:
+            if individual in self._individuals:
+                self._individuals.remove(individual)
+                return True
+            return False
+
+    def replace(self, old, new) -> bool:
+        """Put new in old's place. Returns False, changing nothing, if old is no longer a member."""
+        with self.lock:
+            for i, individual in enumerate(self._individuals):
+                if individual is old:
+                    self._individuals[i] = new
+                    return True
+            return False
+
+    def sort(self, key: Callable, reverse: bool = False):
+        with self.lock:
+            self._individuals.sort(key=key, reverse=reverse)
+
+    def reorder(self, ordering: Callable[[list], list]):
+        """
+        Replace the order with ordering(members), computed under the lock so no member
+        is added or removed in between, e.g. population.reorder(nsga2_sort).
+        """
+        with self.lock:
+            ordered = ordering(list(self._individuals))
+            if len(ordered) != len(self._individuals) or {id(x) for x in ordered} != {id(x) for x in self._individuals}:
+                raise ValueError("reorder must return the same individuals")
+            self._individuals = ordered
+
+    def cap(self, max_size: int) -> list:
+        """
+        Keep the first max_size members.
+
+        Returns:
+            The removed members, for the caller to kill outside the lock
+        """
+        with self.lock:
+            excess = self._individuals[max_size:]
+            del self._individuals[max_size:]
+            return excess
+
+    def find(self, idstr: str):
+        with self.lock:
+            for individual in self._individuals:
+                if individual.idstr == idstr:
+                    return individual
+            return None
+
+    def __iter__(self) -> Iterator:
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._individuals)
+
+    def __getitem__(self, index):
+        with self.lock:
+            return self._individuals[index]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __contains__(self, individual) -> bool:
+        with self.lock:
+            return individual in self._individuals
+
+    def __repr__(self):
+        return f"Population({len(self)} individuals)"
@@ -0,0 +1,177 @@
+import os
+import csv
+import json
+import mmap
+import time
+import struct
+import threading
+import numpy as np
+from typing import Iterator, Optional
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+MAGIC = b"SCRLOG1\n"
+LENGTH = struct.Struct("<I")
+# One index entry per record: where it starts, how long its payload is, and whose it is
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("id", "S64")])
+
+ROW_FIELDS = ["id", "generation", "operator", "parent_ids", "fitness", "runtime", "code_size",
+              "mutations", "created", "killed", "prompt", "genotype", "requirements"]
+
+
+class RunLog:
+    def __init__(self, path: str):
+        """
+        Append-only log of everything that happens to individuals, one record per event.
+
+        Records are JSON payloads behind a 4-byte little-endian length. Every append also
+        writes a fixed-size entry to path + ".idx" with the record's offset, length and
+        individual id, so readers can jump straight to any record. Use RunLogReader to read.
+
+        Args:
+            path: The log file, created if missing and appended to otherwise
+        """
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".idx"
+        self.lock = threading.Lock()
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "ab")
+        self.index = open(self.index_path, "ab")
+        if new:
+            self.file.write(MAGIC)
+            self.file.flush()
+
+    def append(self, kind: str, idstr: str, **fields) -> int:
+        """
+        Append a record. Returns its offset in the log.
+        """
+        payload = json.dumps({"type": kind, "id": idstr, "time": time.time(), **fields}, default=str).encode("utf-8")
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(LENGTH.pack(len(payload)))
+            self.file.write(payload)
+            self.file.flush()
+            entry["offset"], entry["length"], entry["id"] = offset, len(payload), idstr.encode("utf-8")
+            self.index.write(entry.tobytes())
+            self.index.flush()
+        return offset
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            self.index.close()
+
+
+class RunLogReader:
+    def __init__(self, path: str):
+        """
+        Memory-mapped reader for a RunLog. Records are sliced straight out of the map,
+        and the offset index gives random access by individual id without a scan.
+        A record cut short by a crash is ignored.
+        """
+        self.path = os.path.abspath(path)
+        self.index_path = self.path + ".idx"
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a run log")
+        self.index = self._load_index(size)
+        self._by_id: Optional[dict[str, list[int]]] = None
+
+    def _load_index(self, size: int) -> np.ndarray:
+        if os.path.exists(self.index_path):
+            index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+        else:
+            index = self._scan()
+        # Drop entries for records that never fully made it to disk
+        return index[index["offset"] + LENGTH.size + index["length"] <= size]
+
+    def _scan(self) -> np.ndarray:
+        """Rebuild the index by walking the log, for logs whose .idx is missing."""
+        entries = []
+        offset = len(MAGIC)
+        while offset + LENGTH.size <= len(self.map):
+            (length,) = LENGTH.unpack_from(self.map, offset)
+            start = offset + LENGTH.size
+            if start + length > len(self.map):
+                break
+            record = json.loads(self.map[start:start + length])
+            entries.append((offset, length, str(record.get("id", "")).encode("utf-8")))
+            offset = start + length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def raw(self, position: int) -> memoryview:
+        """The payload of the record at a position in the index, without copying it."""
+        offset, length = int(self.index["offset"][position]), int(self.index["length"][position])
+        start = offset + LENGTH.size
+        return memoryview(self.map)[start:start + length]
+
+    def iter_raw(self) -> Iterator[memoryview]:
+        for position in range(len(self.index)):
+            yield self.raw(position)
+
+    def __iter__(self) -> Iterator[dict]:
+        for payload in self.iter_raw():
+            yield json.loads(bytes(payload))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def records(self, kind: str = None) -> Iterator[dict]:
+        return (record for record in self if kind is None or record["type"] == kind)
+
+    def get(self, idstr: str) -> list[dict]:
+        """Every record of one individual, oldest first."""
+        if self._by_id is None:
+            self._by_id = {}
+            for position, key in enumerate(self.index["id"]):
+                self._by_id.setdefault(key.decode("utf-8"), []).append(position)
+        return [json.loads(bytes(self.raw(position))) for position in self._by_id.get(idstr, [])]
+
+    def ids(self) -> list[str]:
+        return list(dict.fromkeys(key.decode("utf-8") for key in self.index["id"]))
+
+    def rows(self) -> list[dict]:
+        """One row per individual with its latest state, in order of creation."""
+        rows: dict[str, dict] = {}
+        for record in self:
+            row = rows.setdefault(record["id"], {field: None for field in ROW_FIELDS} | {"id": record["id"], "mutations": 0})
+            kind = record["type"]
+            if kind == "create":
+                row.update({key: record.get(key) for key in ("generation", "operator", "prompt", "genotype", "requirements")})
+                row["parent_ids"] = ";".join(record.get("parent_ids") or [])
+                row["created"] = record["time"]
+            elif kind == "mutate":
+                row.update({key: record[key] for key in ("prompt", "genotype", "requirements") if key in record})
+                row["mutations"] += 1
+            elif kind == "kill":
+                row["killed"] = record["time"]
+            if "fitness" in record:
+                row["fitness"] = record["fitness"]
+            objectives = record.get("objectives") or {}
+            for key in ("runtime", "code_size"):
+                if key in objectives:
+                    row[key] = objectives[key]
+        return list(rows.values())
+
+    def to_csv(self, path: str):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=ROW_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def to_parquet(self, path: str):
+        if pyarrow is None:
+            raise ImportError("Parquet export needs pyarrow, install it or use to_csv")
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(self.rows()), path)
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self._file.close()
@@ -1,11 +1,27 @@
 import os
+import py_compile
 import random
 import json
+import math
+import time
+import threading
 from llm_base import LLMBase
 from agents import PhenotypeAgent, GenotypeAgent, TournamentAgent, MaskedCrossoverAgent, UnmaskMutationAgent, TelephoneMutationAgent, ProjectAgent, clean_code
 from genetics import Individual
+from parsing import ParseError
+from validation import GenotypeSpec, validate_genotype
+from wheelhouse import Wheelhouse
+from dependencies import canonicalize_requirements, render_requirements
+from budget import TokenBudget, BudgetExceeded
+from novelty import NoveltyArchive
+from pareto import DEFAULT_OBJECTIVES, nsga2_sort
+from lineage import LineageStore, prompt_hash
+from venvs import VenvPool
+from population import Population
+from runlog import RunLog
 import uuid
 from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 
 class Layer():
@@ -28,23 +44,86 @@ class Layer():
 
         
 class Environment:
-    def __init__(self, project_agent: ProjectAgent, layers: list[Layer]):
+    def __init__(self, project_agent: ProjectAgent, layers: list[Layer], wheelhouse: Wheelhouse = None, lockfile: str = None, budget: TokenBudget = None, novelty_archive: NoveltyArchive = None, lineage: LineageStore = None, share_venvs: bool = False, root: str = None, progress: Callable[[dict], None] = None, fitness_timeout: float = None, run_log: RunLog = None, satisfied: dict[str, str] = None):
+        """
+        Args:
+            root: Directory that holds environment/ and history.png, defaults to the working directory
+            progress: Called with a dict for every progress event, e.g. to write a JSON-lines stream
+            fitness_timeout: Seconds after which a fitness evaluation is aborted
+            run_log: Append-only log that gets a record whenever an individual is created, mutated or killed
+            share_venvs: Give individuals with the same requirements one venv from a VenvPool instead of
+                their own. Saves an install per individual, but their generated code then runs in a
+                shared, writable venv, so one individual can change what the others import
+            satisfied: Distributions every individual's venv already has, name -> version (None for any),
+                dropped from requirements.txt. Venvs don't see system site-packages, so only pass what
+                the venvs themselves provide, e.g. from a venv template
+        """
         self.project_agent = project_agent
+        self.root = os.path.abspath(root or os.getcwd())
+        self.env_dir = os.path.join(self.root, "environment")
+        self.progress = progress
+        self.fitness_timeout = fitness_timeout
+        self.satisfied = satisfied
+        self.fitness_runner = None
+        self.lineage = lineage
+        self.run_log = run_log
+        self.share_venvs = share_venvs
+        self.venv_pool = None
+        self.novelty_archive = novelty_archive
         self.layers = layers
-        self.individuals = []
+        self.wheelhouse = wheelhouse
+        self.lockfile = lockfile
+        self.budget = budget
+        self.generation = 0
+        self.individuals = Population()
         self.schematic = None
+        # The schematic as the project agent wrote it, fenced blocks intact, for the GenotypeSpec
+        self.raw_schematic = None
         self.fitness_code = None
         self.project_prompt = None
+        self.genotype_spec = GenotypeSpec()
         self.history = []
 
+    @property
+    def fitness_path(self) -> str:
+        return os.path.join(self.env_dir, "fitness.py")
+
+    def compile_fitness(self) -> str:
+        """
+        Byte-compile the shared fitness harness once, every individual runs the same .pyc.
+        Venvs are created from this interpreter, so the bytecode matches theirs.
+
+        Returns:
+            The path individuals run, the source itself if it doesn't compile
+        """
+        compiled = os.path.join(self.env_dir, "fitness.pyc")
+        try:
+            py_compile.compile(self.fitness_path, cfile=compiled, doraise=True)
+            self.fitness_runner = compiled
+        except py_compile.PyCompileError as e:
+            print(f"Could not compile fitness.py, running it from source: {e.msg}")
+            self.fitness_runner = self.fitness_path
+        return self.fitness_runner
+
+    def emit(self, event: str, **fields):
+        """Send a progress event to the progress callback, if there is one."""
+        if self.progress is not None:
+            self.progress({"event": event, "time": time.time(), "generation": self.generation, **fields})
+
+    def _make_dirs(self):
+        os.makedirs(os.path.join(self.env_dir, "individuals"), exist_ok=True)
+        os.makedirs(os.path.join(self.env_dir, "dead_individuals"), exist_ok=True)
+        if self.share_venvs:
+            self.venv_pool = VenvPool(os.path.join(self.env_dir, "venvs"))
+
     def init_project(self, prompt):
         self.project_prompt = prompt
         raw_response, schematic, fitness = self.project_agent.generate_project_codes(prompt)
+        self.raw_schematic = schematic
         schematic, fitness = clean_code(schematic), clean_code(fitness)
 
-        # Get absolute path for prompts directory
-        current_dir = os.getcwd()
-        prompts_path = os.path.join(current_dir, "prompts", "universal_code_injections", "partial_fitness.partial_py")
+        # The harness ships with the code, not in the working directory
+        prompts_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", "universal_code_injections", "partial_fitness.partial_py")
         
         with open(prompts_path, "r", encoding="utf-8") as f:
             universal_fitness_code = f.read()
@@ -52,37 +131,129 @@ class Environment:
         completed_fitness_code = universal_fitness_code.replace("{generated_fitness_code}", fitness)
 
         # Create environment directories with absolute paths
-        env_dir = os.path.join(current_dir, "environment")
-        individuals_dir = os.path.join(env_dir, "individuals")
-        dead_individuals_dir = os.path.join(env_dir, "dead_individuals")
-        
-        os.makedirs(env_dir, exist_ok=True)
-        os.makedirs(individuals_dir, exist_ok=True)
-        os.makedirs(dead_individuals_dir, exist_ok=True)
+        self._make_dirs()
 
         # Save files with absolute paths
-        schematic_path = os.path.join(env_dir, "schematic.md")
-        fitness_path = os.path.join(env_dir, "fitness.py")
-        
-        with open(schematic_path, "w", encoding="utf-8") as f:
+        with open(os.path.join(self.env_dir, "schematic.md"), "w", encoding="utf-8") as f:
             f.write(schematic)
-        with open(fitness_path, "w", encoding="utf-8") as f:
+        with open(self.fitness_path, "w", encoding="utf-8") as f:
             f.write(completed_fitness_code)
+        self.compile_fitness()
 
         self.schematic = schematic
         self.fitness_code = fitness
+        self.genotype_spec = GenotypeSpec.from_schematic(self.raw_schematic)
+        self.save_state()
+        self.emit("project", schematic_chars=len(schematic))
         return raw_response, schematic, fitness
+
+    def save_state(self):
+        """Write what resume() needs that isn't already on disk to environment/state.json."""
+        with open(os.path.join(self.env_dir, "state.json"), "w", encoding="utf-8") as f:
+            json.dump({"project_prompt": self.project_prompt, "raw_schematic": self.raw_schematic, "generation": self.generation, "history": self.history}, f)
+
+    def resume(self) -> bool:
+        """
+        Pick up a previous run from environment/ under root: the project, the generation count
+        and every living individual with its last measured fitness.
+
+        Returns:
+            False if there is no previous run to resume
+        """
+        state_path = os.path.join(self.env_dir, "state.json")
+        if not os.path.exists(state_path):
+            return False
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        with open(os.path.join(self.env_dir, "schematic.md"), "r", encoding="utf-8") as f:
+            self.schematic = f.read()
+        self.project_prompt = state["project_prompt"]
+        self.generation = state["generation"]
+        self.history = state["history"]
+        self.raw_schematic = state.get("raw_schematic") or self.schematic
+        self.genotype_spec = GenotypeSpec.from_schematic(self.raw_schematic)
+        self._make_dirs()
+        self.compile_fitness()
+
+        individuals_dir = os.path.join(self.env_dir, "individuals")
+        for ind_id in sorted(os.listdir(individuals_dir)):
+            ind_dir = os.path.join(individuals_dir, ind_id)
+            try:
+                with open(os.path.join(ind_dir, "data.json"), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                individual = Individual(ind_dir, ind_id, wheelhouse=self.wheelhouse, venv_pool=self.venv_pool, venv_dir=data.get("venv"),
+                                        fitness_path=self.fitness_runner, timeout=self.fitness_timeout)
+                individual.load_fitness()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping unreadable individual {ind_id}: {e}")
+                continue
+            self.individuals.add(individual)
+            if self.novelty_archive is not None:
+                self.novelty_archive.add(ind_id, individual.get_prompt())
+        self.individuals.sort(key=lambda x: x.fitness, reverse=True)
+        self.emit("resumed", population=len(self.individuals))
+        return True
+
     def compile(self):
         for layer in self.layers:
             layer.setup(self)
     def get_latest_individual(self):
         return self.individuals[-1].directory
     
-    def evolve(self, generations: int):
+    def scaled(self, count: int) -> int:
+        """Scale a layer's fan-out to the token budget, unchanged when there is no budget."""
+        return self.budget.scaled(count) if self.budget else count
+
+    def population_stats(self) -> dict:
+        fitnesses = [ind.fitness for ind in self.individuals]
+        return {
+            "population": len(fitnesses),
+            "best": max(fitnesses) if fitnesses else None,
+            "mean": sum(fitnesses) / len(fitnesses) if fitnesses else None,
+            "tokens": self.budget.spent if self.budget else None,
+        }
+
+    def evolve(self, generations: int, deadline: float = None):
+        """
+        Run every layer once per generation.
+
+        When the token budget runs out, the generation is still finished: the remaining layers
+        run, so sorting and CapPopulation still happen while layers that need the LLM fail fast
+        or fall back, and the state is saved before evolution stops.
+
+        Args:
+            generations: Number of generations to run
+            deadline: time.time() after which no further layer is started
+        """
+        stop_reason = None
         for _ in range(generations):
-            for layer in self.layers:
-                layer.run(self.individuals)
-            self.history.append(self.individuals[-1].fitness)
+            generation_start = time.time()
+            self.emit("generation_start", **self.population_stats())
+            try:
+                for layer in self.layers:
+                    if deadline is not None and time.time() >= deadline:
+                        stop_reason = "timeout"
+                        break
+                    if self.budget:
+                        self.budget.set_context(self.generation, type(layer).__name__)
+                    layer_start = time.time()
+                    try:
+                        layer.run(self.individuals.snapshot())
+                    except BudgetExceeded as e:
+                        if stop_reason is None:
+                            print(f"Stopping evolution after this generation: {e}")
+                        stop_reason = "budget"
+                    self.emit("layer", layer=type(layer).__name__, seconds=time.time() - layer_start, **self.population_stats())
+            finally:
+                if self.budget and self.individuals:
+                    self.budget.record_fitness(self.generation, max(ind.fitness for ind in self.individuals))
+            if stop_reason == "timeout":
+                break
+            self.generation += 1
+            if self.individuals:
+                self.history.append(self.individuals[-1].fitness)
+            self.save_state()
+            self.emit("generation_end", seconds=time.time() - generation_start, **self.population_stats())
             # save to history.png with improved formatting
             plt.figure(figsize=(10, 6))
             plt.plot(self.history, 'b-', linewidth=2)
@@ -91,14 +262,104 @@ class Environment:
             plt.ylabel('Fitness Score')
             plt.grid(True, linestyle='--', alpha=0.7)
             plt.tight_layout()
-            plt.savefig("history.png", dpi=300)
+            plt.savefig(os.path.join(self.root, "history.png"), dpi=300)
             plt.close()
+            if stop_reason:
+                break
+        if self.budget:
+            print(f"Token budget report: {self.budget.report()}")
+        cache_hit_rate = self.project_agent.llm.cache_hit_rate()
+        if cache_hit_rate is not None:
+            print(f"Prefix cache hit rate: {cache_hit_rate:.1%}")
+        self.emit("done", reason=stop_reason or "completed", cache_hit_rate=cache_hit_rate, **self.population_stats())
     
-    def create_individual(self, phenotype: str, genotype: str, requirements: str):
+    def validate_genotype(self, genotype: str, requirements: str, warnings: list[str] = None) -> list[str]:
+        """
+        Cheap static checks against the schematic, run before any files or venvs are created.
+
+        Args:
+            warnings: If given, non-fatal findings such as possibly unlisted imports are appended
+                to it, e.g. for GenotypeAgent's re-prompt, otherwise they are printed
+
+        Returns:
+            A list of problems, empty if the genotype can be set up
+        """
+        found = []
+        problems = validate_genotype(genotype, requirements, self.genotype_spec, found)
+        if warnings is not None:
+            warnings.extend(found)
+        else:
+            for warning in found:
+                print(f"Warning: {warning}")
+        return problems
+
+    def is_novel(self, prompt: str, exclude: str = None) -> bool:
+        """
+        Check a prompt against the novelty archive before paying for code generation.
+
+        Args:
+            prompt: The candidate prompt
+            exclude: Id of an individual to ignore, e.g. the one being mutated
+        """
+        if self.novelty_archive is None:
+            return True
+        if self.novelty_archive.is_novel(prompt, exclude):
+            return True
+        print("Rejected prompt, it is a near-duplicate of an archived prompt")
+        return False
+
+    def canonical_requirements(self, requirements: str) -> str:
+        """Canonical requirements.txt contents, always including pytest, pinned to the lockfile if set and without already satisfied entries."""
+        return render_requirements(canonicalize_requirements(requirements, lockfile=self.lockfile, satisfied=self.satisfied))
+
+    def log(self, kind: str, individual: Individual, **fields):
+        """Append a record about an individual to the run log, if there is one."""
+        if self.run_log is not None:
+            self.run_log.append(kind, individual.idstr, generation=self.generation, fitness=individual.fitness, objectives=individual.objectives, **fields)
+
+    def kill(self, individual: Individual):
+        """
+        The single way an individual dies: drop it from the population, move it to dead_individuals,
+        and record the death in the run log, the progress stream and the lineage store.
+        """
+        self.individuals.remove(individual)
+        individual.kill()
+        self.log("kill", individual)
+        self.emit("kill", id=individual.idstr, fitness=individual.fitness)
+        if self.lineage is not None:
+            self.lineage.mark_dead(individual.idstr)
+
+    def inherited_venv(self, requirements: str, parent_ids: list[str] = None):
+        """
+        A parent's shared venv the child can use as is, because it already has every requirement
+        the child asks for, or None. Only pooled venvs are handed down, they outlive their users.
+        """
+        if self.venv_pool is None or not parent_ids:
+            return None
+        wanted = set(canonicalize_requirements(requirements, lockfile=self.lockfile, satisfied=self.satisfied))
+        for parent in self.individuals.snapshot():
+            if parent.idstr in parent_ids and self.venv_pool.is_ready(parent.venv_dir):
+                if wanted <= set(parent.requirement_lines):
+                    return parent.venv_dir
+        return None
+
+    def create_individual(self, phenotype: str, genotype: str, requirements: str, parent_ids: list[str] = None, operator: str = None):
+        """
+        Validate, write and set up a new individual, and add it to the population.
+
+        Args:
+            parent_ids: Ids of the individuals it was bred from, stored in data.json and the lineage store
+            operator: Name of the operator that made it, e.g. "masked_crossover"
+        """
+        problems = self.validate_genotype(genotype, requirements)
+        if problems:
+            print(f"Rejected genotype before setup: {problems}")
+            return None
+
         ind_id = str(uuid.uuid4())
         
         # Create directory for the individual using absolute path
-        ind_dir = os.path.abspath(os.path.join("environment", "individuals", ind_id))
+        ind_dir = os.path.join(self.env_dir, "individuals", ind_id)
         os.makedirs(ind_dir, exist_ok=False)
         
         # Save all artifacts using absolute paths
@@ -108,23 +369,46 @@ class Environment:
         with open(os.path.join(ind_dir, "genotype.py"), "w", encoding="utf-8") as f:
             f.write(genotype)
             
+        requirements = self.canonical_requirements(requirements)
         with open(os.path.join(ind_dir, "requirements.txt"), "w", encoding="utf-8") as f:
-            f.write("pytest\n"+requirements)
+            f.write(requirements)
             
         with open(os.path.join(ind_dir, "data.json"), "w", encoding="utf-8") as f:
-            json.dump(data_json_default, f)
+            json.dump({**data_json_default, "parent_ids": list(parent_ids or [])}, f)
+
+        if self.lineage is not None:
+            self.lineage.record(ind_id, phenotype, self.generation, operator, parent_ids)
             
         # Create and add the individual to the population
         individual = Individual(
             directory=ind_dir,  # Using absolute path
             fitness=0,
-            idstr=ind_id
+            idstr=ind_id,
+            wheelhouse=self.wheelhouse,
+            venv_pool=self.venv_pool,
+            venv_dir=self.inherited_venv(requirements, parent_ids),
+            fitness_path=self.fitness_runner,
+            timeout=self.fitness_timeout
         )
-        success = individual.setup()
+        try:
+            success = individual.setup()
+        except Exception as e:
+            # A failed venv or install costs this one attempt, not the whole run
+            print(f"Setup of individual {ind_id} failed: {e}")
+            success = False
+        if self.lineage is not None:
+            self.lineage.update(ind_id, fitness=individual.fitness)
         
+        self.log("create", individual, operator=operator, parent_ids=list(parent_ids or []), prompt=phenotype, genotype=genotype, requirements=requirements)
         
         if success:
-            self.individuals.append(individual)
+            self.emit("individual", id=ind_id, operator=operator, parent_ids=list(parent_ids or []), fitness=individual.fitness)
+            self.individuals.add(individual)
+            if self.novelty_archive is not None:
+                self.novelty_archive.add(ind_id, phenotype)
+            return individual
+        self.kill(individual)
+        return None
 
 
 
@@ -136,34 +420,81 @@ data_json_default = {
 }
 
 class Populate(Layer):
-    def __init__(self, phenotype_agent: PhenotypeAgent, genotype_agent: GenotypeAgent, population_size: int):
+    def __init__(self, phenotype_agent: PhenotypeAgent, genotype_agent: GenotypeAgent, population_size: int, batch_size: int = 1, max_workers: int = 1, max_attempts: int = None):
+        """
+        Args:
+            phenotype_agent: Agent that writes the prompts
+            genotype_agent: Agent that implements them
+            population_size: The target number of individuals
+            batch_size: Phenotypes requested per LLM call, 1 makes one call per phenotype
+            max_workers: Number of LLM calls and individual setups run concurrently
+            max_attempts: Maximum number of candidate individuals to try, defaults to 3 * population_size
+        """
         super().__init__(self.run)
         self.phenotype_agent = phenotype_agent
         self.genotype_agent = genotype_agent
         self.population_size = population_size
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts if max_attempts is not None else 3 * population_size
+
+    def generate_phenotypes(self, needed: int) -> list[str]:
+        """Fan out phenotype requests, batch_size phenotypes per call, and dedupe the results."""
+        calls = math.ceil(needed / self.batch_size)
+
+        def request(_):
+            agent = self.phenotype_agent.fork()
+            try:
+                if self.batch_size > 1:
+                    return agent.generate_phenotypes(self.environment.project_prompt, self.batch_size)[1]
+                return [agent.generate_phenotype(self.environment.project_prompt, temperature=0.7)[1]]
+            except ParseError as e:
+                print(f"Skipping malformed phenotype response: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batches = list(executor.map(request, range(calls)))
+
+        phenotypes = []
+        seen = set()
+        for phenotype in (p for batch in batches for p in batch):
+            key = " ".join(phenotype.lower().split())
+            if key in seen or not self.environment.is_novel(phenotype):
+                continue
+            seen.add(key)
+            phenotypes.append(phenotype)
+        return phenotypes
+
+    def build(self, phenotype: str):
+        try:
+            genotype_response, genotype_code, requirements = self.genotype_agent.fork().generate_genotype(
+                f"Implement the following:\n\n{phenotype}",
+                temperature=0,
+                validator=self.environment.validate_genotype,
+                schematic=self.environment.schematic
+            )
+        except ParseError as e:
+            print(f"Skipping malformed individual: {e}")
+            return None
+        return self.environment.create_individual(phenotype, genotype_code, requirements, operator="populate")
 
     def run(self, individuals: list[Individual]):
         """
-        Create individuals up to the specified population size.
-        
-        Args:
-            population_size: The target number of individuals to create
+        Create individuals up to the specified population size, giving up after max_attempts candidates.
         """
-        while len(self.environment.individuals) < self.population_size:
-            
-            # Generate phenotype (prompt) from project description
-            phenotype_response, phenotype = self.phenotype_agent.generate_phenotype(
-                self.environment.project_prompt,
-                temperature=0.7
-            )
-            
-            # Generate genotype (implementation) from phenotype
-            genotype_response, genotype_code, requirements = self.genotype_agent.generate_genotype(
-                f"Implement the following:\n\n{phenotype}\n\nSchematic:\n{self.environment.schematic}",
-                temperature=0
-            )
-            
-            self.environment.create_individual(phenotype, genotype_code, requirements)
+        attempts = 0
+        while len(self.environment.individuals) < self.population_size and attempts < self.max_attempts:
+            needed = min(self.population_size - len(self.environment.individuals), self.max_attempts - attempts)
+            phenotypes = self.generate_phenotypes(needed)[:needed]
+            # Every round uses up the attempts it asked for, even if nothing usable came back
+            attempts += needed
+
+            # Implement and set up every phenotype concurrently
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(self.build, phenotypes))
+
+        if len(self.environment.individuals) < self.population_size:
+            print(f"Populate stopped after {attempts} attempts with {len(self.environment.individuals)}/{self.population_size} individuals")
 
 class MaskedCrossover(Layer):
     def __init__(self, crossover_agent: MaskedCrossoverAgent, selection_function: Callable, num_families: int, num_children: int, genotype_agent: GenotypeAgent):
@@ -175,46 +506,294 @@ class MaskedCrossover(Layer):
         self.num_children = num_children
 
     def run(self, individuals: list[Individual]):
-        parent1, parent2 = self.selection_function(individuals)
+        parents = self.selection_function(individuals)
+        if len(parents) < 2:
+            print(f"Skipping crossover, selection returned {len(parents)} parent(s)")
+            return
+        parent1, parent2 = parents[:2]
 
-        for _ in range(self.num_families):
-            for _ in range(self.num_children):
-                response, child_prompt = self.crossover_agent.crossover(parent1, parent2)
+        for _ in range(self.environment.scaled(self.num_families)):
+            for _ in range(self.environment.scaled(self.num_children)):
+                try:
+                    response, child_prompt = self.crossover_agent.crossover(parent1, parent2)
+                    if not self.environment.is_novel(child_prompt):
+                        continue
 
-                genotype_response, genotype_code, requirements = self.genotype_agent.generate_genotype(
-                f"Implement the following:\n\n{child_prompt}\n\nSchematic:\n{self.environment.schematic}",
-                temperature=0)
-                self.environment.create_individual(child_prompt, genotype_code, requirements)
+                    genotype_response, genotype_code, requirements = self.genotype_agent.generate_genotype(
+                    f"Implement the following:\n\n{child_prompt}",
+                    temperature=0,
+                    validator=self.environment.validate_genotype,
+                    schematic=self.environment.schematic)
+                except ValueError as e:
+                    # ParseError is a ValueError, as is a child prompt that still contains [MASK]
+                    print(f"Skipping malformed child: {e}")
+                    continue
+                self.environment.create_individual(child_prompt, genotype_code, requirements, parent_ids=[parent1.idstr, parent2.idstr], operator="masked_crossover")
 
 class MaskedMutation(Layer):
-    def __init__(self, mutation_agent: UnmaskMutationAgent, selection_function: Callable, genotype_agent: GenotypeAgent, mask_rate: float = 0.3, mask_size: range = range(1, 10)):
+    def __init__(self, mutation_agent: UnmaskMutationAgent, selection_function: Callable, genotype_agent: GenotypeAgent, mask_rate: float = 0.3, mask_size: range = range(1, 10), granularity: str = "word", keep_parent: bool = False):
+        """
+        Args:
+            keep_parent: If True, each mutation becomes a new child next to its parent instead of
+                replacing it, so the parent survives until CapPopulation decides which is better
+        """
         super().__init__(self.run)
         self.mutation_agent = mutation_agent
         self.selection_function = selection_function
         self.genotype_agent = genotype_agent
         self.mask_rate = mask_rate
         self.mask_size = mask_size
+        self.granularity = granularity
+        self.keep_parent = keep_parent
 
     def run(self, individuals: list[Individual]):
+        # Each individual is mutated in place at most once per run, selections that sample
+        # with replacement would otherwise overwrite one mutation with the next
+        individuals = list({id(individual): individual for individual in self.selection_function(individuals)}.values())
+
+        # Mask the prompts of every selected individual in one batch
+        masking = self.mutation_agent.configure_masking(self.mask_rate, self.mask_size, granularity=self.granularity)
+        masked_prompts = masking.mask_batch([individual.get_prompt() for individual in individuals])
+        print(f"Masked {masking.last_stats}")
+
+        for individual, masked_prompt in zip(individuals, masked_prompts):
+            if individual not in self.environment.individuals:
+                # Killed since selection, e.g. by another layer, its directory is gone
+                continue
+            try:
+                # Fill in the masked prompt
+                response, mutated_prompt = self.mutation_agent.unmask(masked_prompt, temperature=0.7)
+                if not self.environment.is_novel(mutated_prompt, exclude=individual.idstr):
+                    continue
+                
+                # Generate genotype from the mutated prompt
+                genotype_response, genotype_code, requirements = self.genotype_agent.generate_genotype(
+                    f"Implement the following:\n\n{mutated_prompt}",
+                    temperature=0,
+                    validator=self.environment.validate_genotype,
+                    schematic=self.environment.schematic
+                )
+            except ParseError as e:
+                print(f"Skipping malformed mutation of {individual.idstr}: {e}")
+                continue
+            problems = self.environment.validate_genotype(genotype_code, requirements)
+            if problems:
+                print(f"Keeping {individual.idstr} unchanged, mutated genotype was rejected: {problems}")
+                continue
+            if self.keep_parent:
+                self.environment.create_individual(mutated_prompt, genotype_code, requirements, parent_ids=[individual.idstr], operator="masked_mutation")
+                continue
+            canonical = self.environment.canonical_requirements(requirements)
+            try:
+                evaluated = individual.reset_attributes(mutated_prompt, genotype_code, canonical)
+            except Exception as e:
+                print(f"Reinstalling requirements of {individual.idstr} failed: {e}")
+                evaluated = False
+            if self.environment.novelty_archive is not None:
+                self.environment.novelty_archive.add(individual.idstr, mutated_prompt)
+            if self.environment.lineage is not None:
+                # Mutated in place, so it keeps its id while the state it replaced becomes its parent
+                self.environment.lineage.record_mutation(individual.idstr, mutated_prompt, self.environment.generation, "masked_mutation", fitness=individual.fitness)
+            self.environment.log("mutate", individual, prompt=mutated_prompt, genotype=genotype_code, requirements=canonical)
+            if not evaluated:
+                # Its files already hold the broken mutation, so it can't stay in the population
+                self.environment.kill(individual)
         
-        for individual in individuals:
-            # Apply masked mutation to the prompt
-            response, mutated_prompt = self.mutation_agent.unmask_mutation(
-                individual.get_prompt(), 
-                temperature=0.7, 
-                mask_rate=self.mask_rate, 
-                mask_size=self.mask_size, 
-                split_by_spaces=True
-            )
-            
-            # Generate genotype from the mutated prompt
-            genotype_response, genotype_code, requirements = self.genotype_agent.answer(
-                f"Implement the following:\n\n{mutated_prompt}\n\nSchematic:\n{self.environment.schematic}",
-                self.genotype_agent.model,
-                tags=["genotype_py", "requirements_txt"]
-            )
-            individual.reset_attributes(mutated_prompt, genotype_code, requirements)
+class TelephoneMutation(Layer):
+    def __init__(self, telephone_agent: TelephoneMutationAgent, selection_function: Callable, genotype_agent: GenotypeAgent, temperature: float = 0.7):
+        """
+        Describe an individual's code as a new prompt and implement that prompt as a new child,
+        so implementation details can flow back into the prompts.
+        """
+        super().__init__(self.run)
+        self.telephone_agent = telephone_agent
+        self.selection_function = selection_function
+        self.genotype_agent = genotype_agent
+        self.temperature = temperature
+
+    def run(self, individuals: list[Individual]):
+        for individual in self.selection_function(individuals):
+            try:
+                response, child_prompt = self.telephone_agent.telephone_mutation(individual.get_genotype(), temperature=self.temperature)
+                if not self.environment.is_novel(child_prompt):
+                    continue
+
+                genotype_response, genotype_code, requirements = self.genotype_agent.generate_genotype(
+                    f"Implement the following:\n\n{child_prompt}",
+                    temperature=0,
+                    validator=self.environment.validate_genotype,
+                    schematic=self.environment.schematic
+                )
+            except ParseError as e:
+                print(f"Skipping malformed telephone mutation of {individual.idstr}: {e}")
+                continue
+            self.environment.create_individual(child_prompt, genotype_code, requirements, parent_ids=[individual.idstr], operator="telephone")
+
+class AdaptiveOperators(Layer):
+    def __init__(self, operators: dict[str, Layer], pulls_per_generation: int, exploration: float = 1.0):
+        """
+        Spend each generation's operator budget on whichever operators have produced
+        the most fitness gain per unit of cost, using a UCB1 bandit.
         
+        Gain is the summed improvement of new or changed individuals over the population's
+        mean fitness before the pull. Cost is tokens when the environment has a TokenBudget,
+        otherwise wall-clock seconds.
+        
+        Args:
+            operators: Operator layers by name, e.g. {"crossover": MaskedCrossover(...), "telephone": TelephoneMutation(...)}.
+                Configure each for a single, small step (e.g. num_families=1, num_children=1)
+            pulls_per_generation: Number of operator runs per generation, scaled to the token budget
+            exploration: UCB1 exploration constant
+        """
+        super().__init__(self.run)
+        self.operators = operators
+        self.pulls_per_generation = pulls_per_generation
+        self.exploration = exploration
+        self.stats = {name: {"pulls": 0, "gain": 0.0, "cost": 0.0, "tokens": 0, "seconds": 0.0} for name in operators}
+
+    def setup(self, environment: "Environment"):
+        super().setup(environment)
+        for operator in self.operators.values():
+            operator.setup(environment)
+
+    def yield_of(self, name: str) -> float:
+        stats = self.stats[name]
+        return stats["gain"] / stats["cost"] if stats["cost"] else 0.0
+
+    def choose(self) -> str:
+        untried = [name for name, stats in self.stats.items() if stats["pulls"] == 0]
+        if untried:
+            return random.choice(untried)
+        total_pulls = sum(stats["pulls"] for stats in self.stats.values())
+        best_yield = max(self.yield_of(name) for name in self.stats) or 1.0
+        def ucb(name):
+            bonus = self.exploration * math.sqrt(2 * math.log(total_pulls) / self.stats[name]["pulls"])
+            return self.yield_of(name) / best_yield + bonus
+        return max(self.stats, key=ucb)
+
+    def pull(self, name: str):
+        budget = self.environment.budget
+        before = {ind.idstr: ind.fitness for ind in self.environment.individuals}
+        mean_before = sum(before.values()) / len(before) if before else 0.0
+        tokens_before = budget.spent if budget else 0
+        start = time.time()
+
+        self.operators[name].run(self.environment.individuals.snapshot())
+
+        seconds = time.time() - start
+        tokens = (budget.spent - tokens_before) if budget else 0
+        changed = [ind for ind in self.environment.individuals if before.get(ind.idstr) != ind.fitness]
+        gain = sum(max(0.0, ind.fitness - mean_before) for ind in changed)
+
+        stats = self.stats[name]
+        stats["pulls"] += 1
+        stats["gain"] += gain
+        stats["tokens"] += tokens
+        stats["seconds"] += seconds
+        stats["cost"] += tokens if budget else seconds
+
+    def run(self, individuals: list[Individual]):
+        for _ in range(self.environment.scaled(self.pulls_per_generation)):
+            self.pull(self.choose())
+        print("Operator yields: " + ", ".join(f"{name}={self.yield_of(name):.3g} ({stats['pulls']} pulls)" for name, stats in self.stats.items()))
+        return self.environment.individuals
+
+class SmartTournament(Layer):
+    def __init__(self, tournament_agent: TournamentAgent, matches_per_individual: int = 2, max_workers: int = 4, temperature: float = 0):
+        """
+        Rank the population by LLM-judged pairwise matches between prompts, best win rate first,
+        with fitness breaking ties. The win rate is stored as objectives["tournament"], so
+        ParetoSort can use it too. Put it before CapPopulation.
+
+        Verdicts are cached by the pair of prompt hashes, so repeated match-ups cost nothing.
+        Once the token budget is exhausted, matches are decided by fitness instead.
+
+        Args:
+            tournament_agent: Agent that judges the matches
+            matches_per_individual: Opponents drawn for every individual, scaled to the token budget
+            max_workers: Number of matches judged concurrently
+            temperature: Judge temperature
+        """
+        super().__init__(self.run)
+        self.tournament_agent = tournament_agent
+        self.matches_per_individual = matches_per_individual
+        self.max_workers = max_workers
+        self.temperature = temperature
+        self.verdicts: dict[tuple[str, str], str] = {}
+        self.lock = threading.Lock()
+        self.stats = {"judged": 0, "cached": 0, "fallback": 0}
+
+    def _count(self, outcome: str):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def pairings(self, individuals: list[Individual]) -> list[tuple[Individual, Individual]]:
+        """Random opponents for every individual, without playing the same pair twice."""
+        matches = min(self.environment.scaled(self.matches_per_individual), len(individuals) - 1)
+        seen = set()
+        pairs = []
+        for individual in individuals:
+            others = [other for other in individuals if other is not individual]
+            for opponent in random.sample(others, matches):
+                key = frozenset((individual.idstr, opponent.idstr))
+                if key not in seen:
+                    seen.add(key)
+                    pairs.append((individual, opponent))
+        return pairs
+
+    def judge(self, a: Individual, b: Individual, hashes: dict[str, str]) -> Individual:
+        hash_a, hash_b = hashes[a.idstr], hashes[b.idstr]
+        if hash_a == hash_b:
+            return a if a.fitness >= b.fitness else b
+        key = (hash_a, hash_b) if hash_a < hash_b else (hash_b, hash_a)
+        with self.lock:
+            cached = self.verdicts.get(key)
+        if cached is not None:
+            self._count("cached")
+            return a if cached == hash_a else b
+
+        budget = self.environment.budget
+        if budget is None or not budget.exhausted:
+            # Always present the pair in key order, so the verdict doesn't depend on who drew whom
+            first, second = (a, b) if key[0] == hash_a else (b, a)
+            try:
+                response, winner_index = self.tournament_agent.fork().judge(
+                    first.get_prompt(), second.get_prompt(), self.environment.project_prompt, temperature=self.temperature)
+                winner = (first, second)[winner_index]
+                with self.lock:
+                    self.verdicts[key] = hashes[winner.idstr]
+                self._count("judged")
+                return winner
+            except (BudgetExceeded, ParseError) as e:
+                print(f"Deciding match by fitness: {e}")
+        self._count("fallback")
+        return a if a.fitness >= b.fitness else b
+
+    def run(self, individuals: list[Individual]):
+        population = self.environment.individuals.snapshot()
+        if len(population) < 2:
+            return self.environment.individuals
+        hashes = {individual.idstr: prompt_hash(individual.get_prompt()) for individual in population}
+        self.tournament_agent.set_context("Problem", self.environment.project_prompt)
+        pairs = self.pairings(population)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            winners = list(executor.map(lambda pair: self.judge(*pair, hashes), pairs))
+
+        wins = {individual.idstr: 0 for individual in population}
+        played = dict(wins)
+        for (a, b), winner in zip(pairs, winners):
+            played[a.idstr] += 1
+            played[b.idstr] += 1
+            wins[winner.idstr] += 1
+        for individual in population:
+            individual.objectives["tournament"] = wins[individual.idstr] / played[individual.idstr] if played[individual.idstr] else 0.0
+
+        # Individuals added while the matches ran have no win rate yet and go last
+        self.environment.individuals.sort(key=lambda x: (x.objectives.get("tournament", 0.0), x.fitness), reverse=True)
+        print(f"Tournament: {len(pairs)} matches, {self.stats}")
+        return self.environment.individuals
+
 class SortByFitness(Layer):
     def __init__(self):
         super().__init__(self.run)
@@ -224,6 +803,22 @@ class SortByFitness(Layer):
         self.environment.individuals.sort(key=lambda x: x.fitness, reverse=True)
         return self.environment.individuals
 
+class ParetoSort(Layer):
+    def __init__(self, objectives: tuple[tuple[str, bool], ...] = DEFAULT_OBJECTIVES):
+        """
+        Sort the population by NSGA-II Pareto front and crowding distance.
+        Put it before CapPopulation to keep the best trade-offs instead of the highest score.
+        
+        Args:
+            objectives: (name, maximize) pairs read from Individual.objectives
+        """
+        super().__init__(self.run)
+        self.objectives = objectives
+
+    def run(self, individuals: list[Individual]):
+        self.environment.individuals.reorder(lambda members: nsga2_sort(members, self.objectives))
+        return self.environment.individuals
+
 class CapPopulation(Layer):
     def __init__(self, max_size: int):
         super().__init__(self.run)
@@ -234,12 +829,13 @@ class CapPopulation(Layer):
         if not individuals:
             return []
             
-        # Kill individuals that exceed the maximum population size
-        excess_individuals = self.environment.individuals[self.max_size:]
-        for individual in excess_individuals:
-            # Call kill() to move the individual to dead_individuals directory
-            individual.kill()
-            
-        # Update the environment's individuals list to only include the survivors
-        self.environment.individuals = self.environment.individuals[:self.max_size]
-        return self.environment.individuals
\ No newline at end of file
+        # Drop the individuals past the maximum population size in one step, then kill them
+        max_size = self.environment.scaled(self.max_size)
+        for individual in self.environment.individuals.cap(max_size):
+            # Move the individual to dead_individuals directory and record its death
+            self.environment.kill(individual)
+        return self.environment.individuals
+
+if __name__ == "__main__":
+    from cli import main
+    main()
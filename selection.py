@@ -1,18 +1,23 @@
 import random
 from typing import List, Callable, Tuple
 from genetics import Individual
+from novelty import NoveltyArchive
+from pareto import DEFAULT_OBJECTIVES, objective_vector, pareto_rank
 
-def random_selection(individuals: List[Individual], k: int = 2) -> List[Individual]:
+def random_selection(individuals: List[Individual], k: int = 2, replace: bool = False) -> List[Individual]:
     """
     Randomly selects k individuals from the population.
     
     Args:
         individuals: List of individuals to select from
         k: Number of individuals to select
+        replace: Select with replacement, so k individuals come back even from a smaller population
         
     Returns:
         List of selected individuals
     """
+    if replace:
+        return random.choices(individuals, k=k) if individuals else []
     return random.sample(individuals, min(k, len(individuals)))
 
 def tournament_selection(individuals: List[Individual], tournament_size: int = 3, k: int = 2) -> List[Individual]:
@@ -151,6 +156,61 @@ def diversity_selection(individuals: List[Individual], k: int = 2,
                 
     return selected
 
+def novelty_selection(individuals: List[Individual], archive: NoveltyArchive, k: int = 2,
+                      novelty_weight: float = 0.5, neighbours: int = 5) -> List[Individual]:
+    """
+    Selects the k individuals with the best blend of fitness and prompt novelty.
+    
+    Args:
+        individuals: List of individuals to select from
+        archive: NoveltyArchive holding the prompts seen so far
+        k: Number of individuals to select
+        novelty_weight: Weight of novelty against min-max normalized fitness (0 = fitness only)
+        neighbours: Number of nearest archived prompts used for the novelty score
+        
+    Returns:
+        List of selected individuals
+    """
+    if not individuals:
+        return []
+    
+    fitnesses = [ind.fitness for ind in individuals]
+    low, high = min(fitnesses), max(fitnesses)
+    span = (high - low) or 1.0
+    
+    def score(ind: Individual) -> float:
+        novelty = archive.novelty(ind.get_prompt(), neighbours, exclude=ind.idstr)
+        return (1 - novelty_weight) * (ind.fitness - low) / span + novelty_weight * novelty
+    
+    return sorted(individuals, key=score, reverse=True)[:k]
+
+def nsga2_selection(individuals: List[Individual], k: int = 2,
+                    objectives: Tuple[Tuple[str, bool], ...] = DEFAULT_OBJECTIVES) -> List[Individual]:
+    """
+    Selects k individuals with NSGA-II binary tournaments over several objectives.
+    
+    The individual on the better Pareto front wins, ties go to the one in the less
+    crowded region of its front.
+    
+    Args:
+        individuals: List of individuals to select from
+        k: Number of individuals to select
+        objectives: (name, maximize) pairs read from Individual.objectives
+        
+    Returns:
+        List of selected individuals
+    """
+    if not individuals:
+        return []
+    
+    ranks = pareto_rank([objective_vector(ind.objectives, objectives) for ind in individuals])
+    selected = []
+    for _ in range(k):
+        a, b = random.randrange(len(individuals)), random.randrange(len(individuals))
+        winner = a if (ranks[a][0], -ranks[a][1]) <= (ranks[b][0], -ranks[b][1]) else b
+        selected.append(individuals[winner])
+    return selected
+
 def parent_pairs_selection(individuals: List[Individual], 
                           selection_func: Callable[[List[Individual], int], List[Individual]], 
                           num_pairs: int = 1) -> List[Tuple[Individual, Individual]]:
@@ -0,0 +1,227 @@
+import ast
+import sys
+from typing import Optional
+from parsing import FENCE_PATTERN
+from dependencies import normalize_name, parse_requirements
+
+# Import names whose distribution on PyPI is called something else
+IMPORT_TO_DISTRIBUTION = {
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "cv2": "opencv-python",
+    "PIL": "pillow",
+    "yaml": "pyyaml",
+    "bs4": "beautifulsoup4",
+    "dateutil": "python-dateutil",
+    "attr": "attrs",
+    "Crypto": "pycryptodome",
+    "google.protobuf": "protobuf",
+}
+
+# Modules that are always available inside an individual's venv
+PREINSTALLED = {"pytest", "_pytest", "pip", "setuptools", "pkg_resources", "genotype"}
+
+def requirement_names(requirements: str) -> set[str]:
+    """The normalized distribution names listed in a requirements.txt."""
+    return {requirement.name for requirement in parse_requirements(requirements)}
+
+
+class FunctionSpec:
+    def __init__(self, name: str, params: list[str], accepts_varargs: bool = False):
+        self.name = name
+        self.params = params
+        self.accepts_varargs = accepts_varargs
+
+    @classmethod
+    def from_node(cls, node: ast.FunctionDef) -> "FunctionSpec":
+        args = node.args
+        params = [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs]
+        return cls(node.name, params, bool(args.vararg or args.kwarg))
+
+    def __repr__(self):
+        return f"{self.name}({', '.join(self.params)})"
+
+
+class GenotypeSpec:
+    """The symbols and signatures a genotype must define, extracted from the schematic."""
+    def __init__(self, functions: dict[str, FunctionSpec] = None, classes: dict[str, dict[str, FunctionSpec]] = None):
+        self.functions = functions or {}
+        self.classes = classes or {}
+
+    @classmethod
+    def from_schematic(cls, schematic: Optional[str]) -> "GenotypeSpec":
+        """
+        Parse the schematic for top-level functions and classes.
+
+        The schematic is usually Python with `...` bodies, but may be markdown
+        with fenced code blocks; each block is parsed on its own and blocks that
+        are not valid Python are skipped.
+        """
+        spec = cls()
+        if not schematic:
+            return spec
+        blocks = FENCE_PATTERN.findall(schematic) or [schematic]
+        for block in blocks:
+            try:
+                tree = ast.parse(block)
+            except SyntaxError:
+                continue
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    spec.functions[node.name] = FunctionSpec.from_node(node)
+                elif isinstance(node, ast.ClassDef):
+                    spec.classes[node.name] = {
+                        item.name: FunctionSpec.from_node(item)
+                        for item in node.body
+                        if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+                    }
+        return spec
+
+    def is_empty(self) -> bool:
+        return not self.functions and not self.classes
+
+
+def _check_signature(required: FunctionSpec, node: ast.FunctionDef, owner: str = "") -> Optional[str]:
+    actual = FunctionSpec.from_node(node)
+    if actual.accepts_varargs:
+        return None
+    missing = [p for p in required.params if p not in actual.params]
+    if missing:
+        return f"{owner}{node.name}() is missing parameters {missing}, the schematic requires {owner}{required}"
+    return None
+
+
+IMPORT_ERROR_HANDLERS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+def _catches_import_error(node: ast.Try) -> bool:
+    for handler in node.handlers:
+        if handler.type is None:
+            return True
+        types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+        for exception in types:
+            name = exception.id if isinstance(exception, ast.Name) else getattr(exception, "attr", None)
+            if name in IMPORT_ERROR_HANDLERS:
+                return True
+    return False
+
+
+def _imported_modules(tree: ast.Module) -> set[str]:
+    """Module names imported anywhere, except inside try blocks whose handlers catch ImportError."""
+    optional = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Try) and _catches_import_error(node):
+            for stmt in node.body:
+                for child in ast.walk(stmt):
+                    if isinstance(child, (ast.Import, ast.ImportFrom)):
+                        optional.add(id(child))
+
+    modules = set()
+    for node in ast.walk(tree):
+        if id(node) in optional:
+            continue
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module)
+    return modules
+
+
+def _known_distribution(module: str) -> Optional[str]:
+    """The distribution for a module from IMPORT_TO_DISTRIBUTION, matching the longest dotted prefix."""
+    parts = module.split(".")
+    for end in range(len(parts), 0, -1):
+        distribution = IMPORT_TO_DISTRIBUTION.get(".".join(parts[:end]))
+        if distribution:
+            return distribution
+    return None
+
+
+def _distribution_for(module: str) -> Optional[str]:
+    known = _known_distribution(module)
+    if known:
+        return known
+    top = module.split(".")[0]
+    if top in sys.stdlib_module_names or top in PREINSTALLED:
+        return None
+    return top
+
+
+def _is_listed(module: str, distribution: str, listed: set[str]) -> bool:
+    """
+    True if some listed distribution plausibly provides the module: an exact match, or a
+    name containing it, which covers variants like psycopg2-binary, pyjwt, python-dotenv
+    or opencv-python-headless.
+    """
+    names = {normalize_name(distribution), normalize_name(module.split(".")[0])}
+    return any(name == entry or name in entry for name in names for entry in listed)
+
+
+def validate_genotype(genotype: str, requirements: str, spec: Optional[GenotypeSpec] = None, warnings: Optional[list[str]] = None) -> list[str]:
+    """
+    Statically check a genotype before any files are written or venvs created.
+
+    Imports are only rejected when IMPORT_TO_DISTRIBUTION knows their distribution and nothing
+    listed provides it. An import whose distribution can't be resolved from its name is only
+    reported in warnings, since import and distribution names often differ.
+
+    Args:
+        genotype: The contents of genotype.py
+        requirements: The contents of requirements.txt
+        spec: The GenotypeSpec extracted from the schematic
+        warnings: If given, non-fatal findings are appended to it
+
+    Returns:
+        A list of problems, empty if the genotype looks runnable
+    """
+    try:
+        tree = ast.parse(genotype)
+    except SyntaxError as e:
+        return [f"SyntaxError: {e.msg} (line {e.lineno})"]
+
+    problems = []
+    spec = spec or GenotypeSpec()
+    defined = {node.name: node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+    assigned = {target.id for node in tree.body if isinstance(node, ast.Assign) for target in node.targets if isinstance(target, ast.Name)}
+
+    for name, required in spec.functions.items():
+        node = defined.get(name)
+        if node is None:
+            if name not in assigned:
+                problems.append(f"Missing required function {required}")
+            continue
+        if isinstance(node, ast.ClassDef):
+            continue
+        problem = _check_signature(required, node)
+        if problem:
+            problems.append(problem)
+
+    for name, methods in spec.classes.items():
+        node = defined.get(name)
+        if node is None or not isinstance(node, ast.ClassDef):
+            if name not in assigned:
+                problems.append(f"Missing required class {name}")
+            continue
+        actual_methods = {item.name: item for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        for method_name, required in methods.items():
+            if method_name not in actual_methods:
+                # Methods may be inherited from a base class, only report when there is none
+                if not node.bases:
+                    problems.append(f"Class {name} is missing required method {required}")
+                continue
+            problem = _check_signature(required, actual_methods[method_name], owner=f"{name}.")
+            if problem:
+                problems.append(problem)
+
+    listed = requirement_names(requirements or "")
+    for module in sorted(_imported_modules(tree)):
+        distribution = _distribution_for(module)
+        if not distribution or _is_listed(module, distribution, listed):
+            continue
+        message = f"Module '{module}' is imported but '{distribution}' is not in requirements.txt"
+        if _known_distribution(module):
+            problems.append(message)
+        elif warnings is not None:
+            warnings.append(message)
+
+    return problems
@@ -0,0 +1,56 @@
+import os
+import shutil
+import threading
+
+READY_MARKER = ".ready"
+
+
+class VenvPool:
+    def __init__(self, directory: str):
+        """
+        Virtual environments shared between individuals, one per canonical requirements key.
+
+        Individuals with the same dependency set point at the same venv instead of each
+        creating and installing their own, and a venv survives the individuals that use it,
+        so children can keep inheriting it after their parents are killed.
+
+        Args:
+            directory: Where the venvs are created, one subdirectory per requirements key
+        """
+        self.directory = os.path.abspath(directory)
+        self.lock = threading.Lock()
+        self.key_locks: dict[str, threading.Lock] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def is_ready(self, venv_dir: str) -> bool:
+        """True if venv_dir is a pool venv that finished installing."""
+        return os.path.exists(os.path.join(venv_dir, READY_MARKER))
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def acquire(self, individual) -> str:
+        """
+        Point an individual at the venv for its requirements, creating and installing it on first use.
+        Concurrent callers with the same requirements wait for a single install.
+
+        Returns:
+            The venv directory now set on the individual
+        """
+        key = individual.requirements_key
+        venv_dir = self.path_for(key)
+        with self._lock_for(key):
+            individual.venv_dir = venv_dir
+            if self.is_ready(venv_dir):
+                return venv_dir
+            # Anything left here without the marker is from an interrupted install
+            shutil.rmtree(venv_dir, ignore_errors=True)
+            individual.create_venv()
+            individual.install_requirements()
+            with open(os.path.join(venv_dir, READY_MARKER), "w", encoding="utf-8") as f:
+                f.write(key)
+        return venv_dir
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import threading
+from dependencies import canonicalize_requirements, normalize_name, requirements_key
+
+
+class Wheelhouse:
+    def __init__(self, directory: str, offline: bool = False, python: str = sys.executable):
+        """
+        A local directory of wheels that individuals install from instead of PyPI.
+
+        Wheels are built once per distinct requirements file with the host interpreter,
+        which is the interpreter every individual's venv is created from, so they are
+        always compatible. Installs then run with --no-index and never touch the network.
+
+        Args:
+            directory: Where wheels, constraints.txt and resolved.json are stored
+            offline: If True, never download, only install from wheels already present
+            python: The interpreter used to download and build wheels
+        """
+        self.directory = os.path.abspath(directory)
+        self.offline = offline
+        self.python = python
+        self.resolved_path = os.path.join(self.directory, "resolved.json")
+        self.constraints_path = os.path.join(self.directory, "constraints.txt")
+        self.lock = threading.Lock()
+        self.key_locks: dict[str, threading.Lock] = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.resolved = {"packages": {}, "fetched": []}
+        if os.path.exists(self.resolved_path):
+            with open(self.resolved_path, "r", encoding="utf-8") as f:
+                self.resolved.update(json.load(f))
+
+    @staticmethod
+    def requirements_hash(requirements_path: str) -> str:
+        # Keyed on the canonical dependency set, so reordered or re-commented files share wheels
+        with open(requirements_path, "r", encoding="utf-8") as f:
+            return requirements_key(canonicalize_requirements(f.read(), base=()))
+
+    def fetch(self, requirements_path: str) -> bool:
+        """
+        Download and build wheels for every entry in a requirements file.
+
+        Returns:
+            True if the wheels are available (fetched now or earlier), False if fetching failed
+        """
+        key = self.requirements_hash(requirements_path)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # One build per key at a time, the others wait for it and then find the key fetched
+        with key_lock:
+            with self.lock:
+                if key in self.resolved["fetched"]:
+                    return True
+            if self.offline:
+                return False
+
+            # Build into a private directory and move finished wheels in one by one, so installs
+            # reading the wheelhouse never see a partially written wheel
+            print(f"Building wheels for {requirements_path} into {self.directory}...")
+            build_dir = tempfile.mkdtemp(prefix=".build-", dir=self.directory)
+            try:
+                result = subprocess.run(
+                    [self.python, "-m", "pip", "wheel", "-r", requirements_path, "-w", build_dir, "--find-links", self.directory],
+                    capture_output=True,
+                    text=True,
+                    check=False
+                )
+                if result.returncode != 0:
+                    print(f"Error building wheels: {result.stderr}")
+                    return False
+                for name in os.listdir(build_dir):
+                    destination = os.path.join(self.directory, name)
+                    if not os.path.exists(destination):
+                        os.replace(os.path.join(build_dir, name), destination)
+            finally:
+                shutil.rmtree(build_dir, ignore_errors=True)
+
+            with self.lock:
+                if key not in self.resolved["fetched"]:
+                    self.resolved["fetched"].append(key)
+                self._save()
+        return True
+
+    def install(self, venv_python: str, requirements_path: str):
+        """
+        Install a requirements file into a venv from the wheelhouse only.
+
+        Versions resolved by earlier installs are passed as constraints so that every
+        individual gets the same versions; if that conflicts, the install is retried
+        without them.
+        """
+        self.fetch(requirements_path)
+
+        command = [venv_python, "-m", "pip", "install", "--no-index", "--find-links", self.directory, "--disable-pip-version-check", "-r", requirements_path]
+        result = None
+        if os.path.exists(self.constraints_path):
+            result = subprocess.run(command + ["-c", self.constraints_path], capture_output=True, text=True, check=False)
+        if result is None or result.returncode != 0:
+            result = subprocess.run(command, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            print(f"Error installing requirements from wheelhouse: {result.stderr}")
+            raise RuntimeError(f"Failed to install requirements from wheelhouse: {result.stderr}")
+
+        self.record(venv_python)
+
+    def record(self, venv_python: str):
+        """Record the versions installed in a venv into resolved.json and constraints.txt."""
+        result = subprocess.run(
+            [venv_python, "-m", "pip", "freeze", "--disable-pip-version-check"],
+            capture_output=True,
+            text=True,
+            check=False
+        )
+        if result.returncode != 0:
+            return
+        with self.lock:
+            for line in result.stdout.splitlines():
+                if "==" in line:
+                    name, version = line.split("==", 1)
+                    self.resolved["packages"].setdefault(normalize_name(name), version.strip())
+            self._save()
+
+    def _save(self):
+        # Called with self.lock held; written to a temp file and swapped in, since installs read constraints.txt concurrently
+        self._write_atomic(self.resolved_path, json.dumps(self.resolved, indent=2))
+        self._write_atomic(self.constraints_path, "".join(f"{name}=={version}\n" for name, version in sorted(self.resolved["packages"].items())))
+
+    @staticmethod
+    def _write_atomic(path: str, content: str):
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temporary, path)